@@ -0,0 +1,38 @@
+# Time to a usable Organ, YAML vs compiled cache.
+#
+#   python -m benchmarks.organ_startup
+#
+# "yaml" is the old path (parse the YAML, build the organ); "cached" goes
+# through Organ.from_file with a warm cache. Each is the best of N_RUNS.
+from loguru import logger
+from pathlib import Path
+from time import perf_counter
+
+from organ_interface.helpers import load_config
+from organ_interface.organ import Organ
+from organ_interface.organ_cache import build_cache
+
+CONFIG_PATH: Path = Path(__file__).resolve().parent.parent / "config" / "organ" / "hallgrimskirkja.yml"
+N_RUNS: int = 20
+
+
+def best_of(fn) -> float:
+    best: float = float("inf")
+    for _ in range(N_RUNS):
+        start = perf_counter()
+        fn()
+        best = min(best, perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    logger.remove()
+    build_cache(CONFIG_PATH)
+    yaml_s = best_of(lambda: Organ(load_config(CONFIG_PATH)))
+    cached_s = best_of(lambda: Organ.from_file(CONFIG_PATH))
+    print(f"yaml:   {yaml_s*1000:7.2f} ms")
+    print(f"cached: {cached_s*1000:7.2f} ms  ({yaml_s / cached_s:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# Voice.queue_midi throughput: the per-tick cost of building NoteEvents.
+#
+#   python -m benchmarks.queue_midi
+#
+# N_VOICES RatioVoices, each on its own pair of adjacent notes, jump
+# between the two for N_STEPS ticks, so every call releases one note and
+# presses another. The queue
+# completes each event as soon as it is put, like a sender that never
+# falls behind, so note state stays in range and only the event path is
+# timed. The second figure is NoteEvent construction on its own.
+from loguru import logger
+from pathlib import Path
+from time import perf_counter
+
+from organ_interface.organ import Organ, NoteEvent
+from organ_interface.note_attributes import NoteAction
+from organ_interface.voices import RatioVoice
+
+CONFIG_PATH: Path = Path(__file__).resolve().parent.parent / "config" / "organ" / "hallgrimskirkja.yml"
+N_VOICES: int = 60
+N_STEPS: int = 1000
+
+
+class CompletingQueue:
+    def __init__(self) -> None:
+        self.n: int = 0
+
+    def put(self, event, block: bool=True, timeout: float|None=None) -> None:
+        self.n += 1
+        event.midi_complete()
+
+
+def main() -> None:
+    logger.remove()
+    organ = Organ.from_file(CONFIG_PATH)
+    registers = list(organ)
+    voices = []
+    for k in range(N_VOICES):
+        register = registers[k % len(registers)]
+        pair = 2 * (k // len(registers))
+        v = RatioVoice(f"bench-{k}", register)
+        v.create_note_list(register.note_names[pair], register.note_names[pair + 1])
+        v.on()
+        voices.append(v)
+    queue = CompletingQueue()
+    start = perf_counter()
+    for step in range(N_STEPS):
+        ratio = float(step % 2)
+        for v in voices:
+            v.ratio = ratio
+            v.queue_midi(queue)
+    elapsed = perf_counter() - start
+    print(f"queue_midi: {queue.n} events in {elapsed*1000:.1f} ms: {queue.n / elapsed:,.0f} events/s, {elapsed / queue.n * 1e6:.2f} us/event")
+
+    notes = [n for r in registers for n in r][:N_VOICES]
+    actions = (NoteAction.PRESS, NoteAction.RELEASE)
+    n_events = N_STEPS * len(notes) * len(actions)
+    start = perf_counter()
+    for _ in range(N_STEPS):
+        for note in notes:
+            for action in actions:
+                NoteEvent(note, action)
+    elapsed = perf_counter() - start
+    print(f"NoteEvent:  {n_events} events in {elapsed*1000:.1f} ms: {n_events / elapsed:,.0f} events/s, {elapsed / n_events * 1e6:.2f} us/event")
+
+
+if __name__ == "__main__":
+    main()
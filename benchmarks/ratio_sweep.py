@@ -0,0 +1,115 @@
+# Per-step cost of a RatioVoice sweep, per-voice loop vs RatioSweepEngine.
+#
+#   python -m benchmarks.ratio_sweep
+#
+# N_VOICES voices on random C/E/G ranges sweep 0 -> 1 in N_STEPS steps.
+# "loop" is the old increment_all_voice_ratios + queue_all_midi; "engine"
+# steps all ratios at once and only visits voices whose note changed;
+# "traj" precomputes the whole sweep (as cycle_notes does) and looks each
+# tick up, with the one-off precompute time reported separately.
+# Events are completed as soon as they are queued.
+from loguru import logger
+from pathlib import Path
+from time import perf_counter
+import random
+
+import numpy as np
+
+from organ_interface.organ import Organ
+from organ_interface.voices import RatioVoice, RatioSweepEngine
+from organ_interface.trajectories import trajectory
+
+CONFIG_PATH: Path = Path(__file__).resolve().parent.parent / "config" / "organ" / "hallgrimskirkja.yml"
+N_VOICES: int = 300
+N_STEPS: int = 1000
+
+
+class CompletingQueue:
+    def __init__(self) -> None:
+        self.n: int = 0
+
+    def put(self, event, block: bool=True, timeout: float|None=None) -> None:
+        self.n += 1
+        event.midi_complete()
+
+
+def voices(seed: int=0) -> list[RatioVoice]:
+    random.seed(seed)
+    organ = Organ.from_file(CONFIG_PATH)
+    registers = list(organ)
+    result = []
+    for k in range(N_VOICES):
+        v = RatioVoice(f"bench-{k}", random.choice(registers))
+        v.assign_random_range(keep_current=False)
+        v.on()
+        result.append(v)
+    return result
+
+
+def report(name: str, times: list[float], n_events: int) -> None:
+    t = np.array(times) * 1000
+    print(f"{name:6}: mean {t.mean():.3f} ms, p99 {np.percentile(t, 99):.3f} ms, max {t.max():.3f} ms per step ({n_events} events)")
+
+
+def bench_loop() -> None:
+    vs = voices()
+    queue = CompletingQueue()
+    # Flush the initial presses, as cycle_notes does with set_all_voice_ratios.
+    for v in vs:
+        v.queue_midi(queue)
+    queue.n = 0
+    times = []
+    for _ in range(N_STEPS + 1):
+        start = perf_counter()
+        for v in vs:
+            v.ratio += 1.0 / N_STEPS
+        for v in vs:
+            v.queue_midi(queue)
+        times.append(perf_counter() - start)
+    report("loop", times, queue.n)
+
+
+def bench_engine() -> None:
+    vs = voices()
+    queue = CompletingQueue()
+    # Flush the initial presses, as cycle_notes does with set_all_voice_ratios.
+    for v in vs:
+        v.queue_midi(queue)
+    queue.n = 0
+    engine = RatioSweepEngine(vs)
+    times = []
+    for _ in range(N_STEPS + 1):
+        start = perf_counter()
+        engine.queue_midi(engine.step(1.0 / N_STEPS), queue)
+        times.append(perf_counter() - start)
+    report("engine", times, queue.n)
+
+
+def bench_trajectory(easing: str) -> None:
+    vs = voices()
+    queue = CompletingQueue()
+    for v in vs:
+        v.queue_midi(queue)
+    queue.n = 0
+    engine = RatioSweepEngine(vs)
+    start = perf_counter()
+    engine.load_trajectory(trajectory(easing, N_STEPS, len(engine), seed=0))
+    print(f"{easing}: precompute {(perf_counter() - start)*1000:.2f} ms")
+    times = []
+    for k in range(N_STEPS + 1):
+        start = perf_counter()
+        engine.queue_midi(engine.seek(k), queue)
+        times.append(perf_counter() - start)
+    report("traj", times, queue.n)
+
+
+def main() -> None:
+    logger.remove()
+    bench_loop()
+    bench_engine()
+    bench_trajectory("linear")
+    bench_trajectory("random_walk")
+
+
+if __name__ == "__main__":
+    main()
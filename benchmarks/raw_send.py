@@ -0,0 +1,58 @@
+# Events per second through the encode + send path, old vs new.
+#
+#   python -m benchmarks.raw_send
+#
+# "mido" builds a validated Message per event and lets the port serialise
+# it (the old NoteEvent path); "raw" looks the bytes up in the pre-encoded
+# table and hands them straight to the port.
+from mido import Message as MidiMessage
+from time import perf_counter
+
+from organ_interface.midi_bytes import raw_note_message
+from organ_interface.note_attributes import NoteAction
+
+N_EVENTS: int = 200_000
+
+
+class NullRtPort:
+    def __init__(self) -> None:
+        self.n_bytes: int = 0
+
+    def send_message(self, data: bytes) -> None:
+        self.n_bytes += len(data)
+
+
+def _events() -> list[tuple[NoteAction, int, int]]:
+    actions = (NoteAction.PRESS, NoteAction.RELEASE)
+    return [(actions[k % 2], k % 16, 36 + k % 58) for k in range(N_EVENTS)]
+
+
+def bench_mido(events: list[tuple[NoteAction, int, int]]) -> float:
+    rt = NullRtPort()
+    start = perf_counter()
+    for action, channel, note in events:
+        msg = MidiMessage(type=action.midi_message, note=note, velocity=127, channel=channel)
+        rt.send_message(msg.bytes())
+    return len(events) / (perf_counter() - start)
+
+
+def bench_raw(events: list[tuple[NoteAction, int, int]]) -> float:
+    rt = NullRtPort()
+    send_raw = rt.send_message
+    start = perf_counter()
+    for action, channel, note in events:
+        send_raw(raw_note_message(action, channel, note))
+    return len(events) / (perf_counter() - start)
+
+
+def main() -> None:
+    events = _events()
+    mido_rate = bench_mido(events)
+    raw_rate = bench_raw(events)
+    print(f"mido Message path: {mido_rate:12,.0f} events/s")
+    print(f"raw table path:    {raw_rate:12,.0f} events/s")
+    print(f"speedup:           {raw_rate / mido_rate:12.1f}x")
+
+
+if __name__ == "__main__":
+    main()
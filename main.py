@@ -3,6 +3,7 @@ from pathlib import Path
 from organ_interface.organ import Organ, Register, Note, NoteState
 from organ_interface.note_attributes import NoteName, NoteAction
 from organ_interface.helpers import load_config, get_full_path
+from organ_interface import tracing
 
 from organ_interface.voices import VoiceManager, Voice, RatioVoice, ComputerVoice, WebVoice, VoiceController
 
@@ -174,16 +175,15 @@ def main() -> None:
         logger.add(sys.stderr, level="INFO")
 
     common_config = load_config(get_full_path("config/common.yml"))
+    tracing.configure(common_config.get("tracing", {}))
     midi_config = common_config.get("midi_config")
-    organ_config = load_config(get_full_path(f"config/{common_config.get('organ_config_file')}"))
-
-    organ: Organ = Organ(organ_config)
+    organ: Organ = Organ.from_file(get_full_path(f"config/{common_config.get('organ_config_file')}"))
 
     logger.info(organ)
     for r in organ:
         logger.info(r)
 
-    midi_output: MidiOutput = MidiOutput(midi_config)
+    midi_output: MidiOutput = MidiOutput(midi_config, organ)
     midi_output.start_midi_output_thread()
     if PANIC:
         midi_output.send_stop_event()
@@ -233,7 +233,6 @@ def main() -> None:
             logger.error(e)
 
     midi_output.stop_midi_output_thread()
-    midi_output.panic()
 
 
 ########
@@ -252,15 +251,13 @@ def main_OLD() -> None:
 
     common_config = load_config(get_full_path("config/common.yml"))
     midi_config = common_config.get("midi_config")
-    organ_config = load_config(get_full_path(f"config/{common_config.get('organ_config_file')}"))
-
-    organ: Organ = Organ(organ_config)
+    organ: Organ = Organ.from_file(get_full_path(f"config/{common_config.get('organ_config_file')}"))
 
     logger.info(organ)
     for r in organ:
         logger.info(r)
 
-    midi_output: MidiOutput = MidiOutput(midi_config)
+    midi_output: MidiOutput = MidiOutput(midi_config, organ)
     midi_output.start_midi_output_thread()
 
     vm = VoiceManager(organ, midi_output.queue)
@@ -315,7 +312,6 @@ def main_OLD() -> None:
         test_voices(vm, midi_output.queue)
     except KeyboardInterrupt:
         midi_output.stop_midi_output_thread()
-        midi_output.panic()
 
 
     midi_output.stop_midi_output_thread()
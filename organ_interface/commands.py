@@ -0,0 +1,95 @@
+from loguru import logger
+from collections import deque
+from concurrent.futures import Future
+from threading import Lock, get_ident
+from typing import Callable
+
+
+class Command:
+    __slots__ = ("fn", "args", "kwargs", "future")
+
+    def __init__(self, fn: Callable, args: tuple, kwargs: dict[str, any]) -> None:
+        self.fn: Callable = fn
+        self.args: tuple = args
+        self.kwargs: dict[str, any] = kwargs
+        self.future: Future = Future()
+
+    def run(self) -> None:
+        try:
+            self.future.set_result(self.fn(*self.args, **self.kwargs))
+        except Exception as e:
+            logger.error(f"Command {getattr(self.fn, '__name__', self.fn)} failed: {e}")
+            self.future.set_exception(e)
+
+    def __repr__(self) -> str:
+        return f"<Command {getattr(self.fn, '__name__', self.fn)}{self.args}>"
+
+
+class CommandQueue:
+    # Hands work on voice and note state to the one thread that owns it.
+    # Any thread can submit(); only the owner drains, once per control
+    # tick or while it idles, so changes never interleave with a sweep.
+    # With no owner claimed, commands run straight away on the caller.
+    # The owner check and the append happen under _owner_lock, as does a
+    # release, so a command can never land after the final drain.
+    def __init__(self, name: str="commands", max_per_drain: int=256) -> None:
+        self._name: str = name
+        self._max_per_drain: int = max_per_drain
+        self._pending: deque[Command] = deque()
+        self._owner: int|None = None
+        self._owner_lock: Lock = Lock()
+
+    @property
+    def owner(self) -> int|None:
+        return self._owner
+
+    @property
+    def is_owner(self) -> bool:
+        return self._owner == get_ident()
+
+    def claim(self) -> None:
+        # Makes the calling thread the owner, running anything queued so far.
+        if self._owner is not None and not self.is_owner:
+            logger.warning(f"{self._name}: owner changed from thread {self._owner} to {get_ident()}")
+        with self._owner_lock:
+            self._owner = get_ident()
+        self.drain(limit=0)
+
+    def release(self) -> None:
+        if not self.is_owner:
+            return
+        with self._owner_lock:
+            self._owner = None
+            left: list[Command] = list(self._pending)
+            self._pending.clear()
+        # Submitted before the release; later ones run on their caller.
+        for command in left:
+            command.run()
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        command: Command = Command(fn, args, kwargs)
+        with self._owner_lock:
+            queued: bool = self._owner is not None and self._owner != get_ident()
+            if queued:
+                self._pending.append(command)
+        if not queued:
+            command.run()
+        return command.future
+
+    def drain(self, limit: int|None=None) -> int:
+        # Runs up to limit pending commands (max_per_drain by default, 0
+        # for no limit) in submission order; returns how many ran. Only
+        # the owner runs anything.
+        if not self.is_owner:
+            return 0
+        limit = self._max_per_drain if limit is None else limit
+        n: int = 0
+        while self._pending and (not limit or n < limit):
+            self._pending.popleft().run()
+            n += 1
+        if self._pending and n:
+            logger.debug(f"{self._name}: {len(self._pending)} commands left for the next drain")
+        return n
+
+    def __len__(self) -> int:
+        return len(self._pending)
@@ -0,0 +1,102 @@
+from loguru import logger
+from time import monotonic
+from typing import Callable
+
+from .helpers import sleep_until
+from .midi_stats import Histogram
+
+# (tick index, tick deadline) -> None
+TickCallback = Callable[[int, float], None]
+
+
+class ClockStats:
+    def __init__(self) -> None:
+        self.ticks: int = 0
+        self.overruns: int = 0
+        self.missed: int = 0
+        self.lateness: Histogram = Histogram()
+        self.work: Histogram = Histogram()
+
+    def as_dict(self) -> dict[str, any]:
+        return {
+            "ticks": self.ticks,
+            "overruns": self.overruns,
+            "missed": self.missed,
+            "lateness": self.lateness.as_dict(),
+            "work": self.work.as_dict(),
+        }
+
+    def summary(self) -> str:
+        return (
+            f"{self.ticks} ticks, {self.overruns} overruns, {self.missed} missed, "
+            f"late p99={self.lateness.percentile(99)*1000:.2f} ms max={self.lateness.max*1000:.2f} ms, "
+            f"work p99={self.work.percentile(99)*1000:.2f} ms"
+        )
+
+
+class ControlClock:
+    # Control-rate ticks on absolute deadlines (start + k * period), so
+    # the time spent in subscribers never pushes later ticks back. A tick
+    # whose subscribers run past the next deadline is an overrun; with
+    # skip_missed, the clock then jumps to the latest passed deadline and
+    # counts the ones before it as missed, rather than running them back
+    # to back. The last tick is never skipped. Subscribers get the tick
+    # index so they can tell when ticks were skipped.
+    def __init__(self, spin_s: float=0.001, skip_missed: bool=True, name: str="control-clock") -> None:
+        self._spin_s: float = spin_s
+        self._skip_missed: bool = skip_missed
+        self._name: str = name
+        self._subscribers: tuple[TickCallback, ...] = ()
+        self._running: bool = False
+        self._stats: ClockStats = ClockStats()
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    @property
+    def stats(self) -> ClockStats:
+        return self._stats
+
+    def subscribe(self, callback: TickCallback) -> None:
+        # Copy on write, so the tick loop never sees a half-updated list.
+        self._subscribers = (*self._subscribers, callback)
+
+    def unsubscribe(self, callback: TickCallback) -> None:
+        self._subscribers = tuple(s for s in self._subscribers if s != callback)
+
+    def stop(self) -> None:
+        self._running = False
+
+    def run(self, ticks: int, period: float, start: float|None=None) -> ClockStats:
+        # Runs the subscribers for ticks ticks on the calling thread.
+        stats: ClockStats = ClockStats()
+        self._stats = stats
+        self._running = True
+        start = monotonic() if start is None else start
+        k: int = 0
+        try:
+            while k < ticks and self._running:
+                deadline: float = start + k * period
+                sleep_until(deadline, self._spin_s)
+                tick_start: float = monotonic()
+                stats.lateness.record(tick_start - deadline)
+                for callback in self._subscribers:
+                    callback(k, deadline)
+                now: float = monotonic()
+                stats.work.record(now - tick_start)
+                stats.ticks += 1
+                k += 1
+                if now > start + k * period:
+                    stats.overruns += 1
+                    if self._skip_missed:
+                        behind: int = max(0, min(int((now - start) / period) - k, ticks - k - 1))
+                        stats.missed += behind
+                        k += behind
+        finally:
+            self._running = False
+        if stats.overruns:
+            logger.warning(f"{self._name}: {stats.summary()}")
+        else:
+            logger.info(f"{self._name}: {stats.summary()}")
+        return stats
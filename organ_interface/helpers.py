@@ -7,6 +7,7 @@ from pathlib import Path
 from yaml import safe_load as safe_load_yaml
 
 import inspect
+from time import monotonic, sleep
 
 # HELPERS
 def clamp_int(value: int, low: int, high: int) -> int:
@@ -24,3 +25,12 @@ def get_full_path(file: str) -> Path:
     caller_frame = inspect.stack()[1]
     caller_file = caller_frame.filename
     return Path(caller_file).resolve().parent / file
+
+def sleep_until(deadline: float, spin_s: float=0.001) -> None:
+    # Coarse sleep until close to the deadline, then spin on the clock
+    # for the last stretch since sleep() can overshoot by a scheduler tick.
+    remaining: float = deadline - monotonic()
+    if remaining > spin_s:
+        sleep(remaining - spin_s)
+    while monotonic() < deadline:
+        pass
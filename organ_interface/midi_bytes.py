@@ -0,0 +1,101 @@
+from .note_attributes import NoteAction
+
+from time import monotonic
+
+# Raw 3-byte channel voice messages, pre-encoded once so the send path
+# never has to build or validate a mido Message.
+NOTE_OFF_STATUS: int = 0x80
+NOTE_ON_STATUS: int = 0x90
+VELOCITY: int = 127
+
+N_CHANNELS: int = 16
+N_NOTES: int = 128
+
+def _build_table(status: int) -> tuple[tuple[bytes, ...], ...]:
+    return tuple(
+        tuple(bytes((status | channel, note, VELOCITY)) for note in range(N_NOTES))
+        for channel in range(N_CHANNELS)
+    )
+
+NOTE_ON_TABLE: tuple[tuple[bytes, ...], ...] = _build_table(NOTE_ON_STATUS)
+NOTE_OFF_TABLE: tuple[tuple[bytes, ...], ...] = _build_table(NOTE_OFF_STATUS)
+
+RAW_NOTE_TABLE: dict[NoteAction, tuple[tuple[bytes, ...], ...]] = {
+    NoteAction.PRESS: NOTE_ON_TABLE,
+    NoteAction.RELEASE: NOTE_OFF_TABLE,
+}
+
+def raw_note_message(action: NoteAction, channel: int, note: int) -> bytes|None:
+    # channel is zero based here, as on the wire.
+    table = RAW_NOTE_TABLE.get(action)
+    if table is None:
+        return None
+    return table[channel][note]
+
+# Channel mode messages used to silence a channel in two messages rather
+# than a note_off per key.
+CONTROL_CHANGE_STATUS: int = 0xB0
+ALL_SOUND_OFF: int = 120
+ALL_NOTES_OFF: int = 123
+
+CHANNEL_SILENCE_TABLE: tuple[tuple[bytes, bytes], ...] = tuple(
+    (
+        bytes((CONTROL_CHANGE_STATUS | channel, ALL_NOTES_OFF, 0)),
+        bytes((CONTROL_CHANGE_STATUS | channel, ALL_SOUND_OFF, 0)),
+    )
+    for channel in range(N_CHANNELS)
+)
+
+# note_off written as note_on with velocity 0, so it can share a running
+# status byte with the note_ons on the same channel.
+NOTE_ON_ZERO_TABLE: tuple[tuple[bytes, ...], ...] = tuple(
+    tuple(bytes((NOTE_ON_STATUS | channel, note, 0)) for note in range(N_NOTES))
+    for channel in range(N_CHANNELS)
+)
+
+class RunningStatusEncoder:
+    # Turns complete channel messages into a running-status byte stream.
+    # Real-time bytes (>= 0xF8) never reach here; any other system byte
+    # cancels running status, as per the MIDI spec.
+    WINDOW_S: float = 1.0
+
+    def __init__(self, note_off_as_note_on: bool=True) -> None:
+        self._note_off_as_note_on: bool = note_off_as_note_on
+        self._last_status: int = -1
+        self.n_bytes_in: int = 0
+        self.n_bytes_out: int = 0
+        self._window_start: float = monotonic()
+        self._window_saved: int = 0
+        self.saved_per_s: float = 0.0
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.n_bytes_in - self.n_bytes_out
+
+    def reset(self) -> None:
+        self._last_status = -1
+
+    def encode(self, raw: bytes) -> bytes:
+        n_in: int = len(raw)
+        status: int = raw[0]
+        if self._note_off_as_note_on and status & 0xF0 == NOTE_OFF_STATUS:
+            raw = NOTE_ON_ZERO_TABLE[status & 0x0F][raw[1]]
+            status = raw[0]
+        out: bytes = raw
+        if status == self._last_status:
+            out = raw[1:]
+        elif status >= 0xF0:
+            self._last_status = -1
+        else:
+            self._last_status = status
+
+        self.n_bytes_in += n_in
+        self.n_bytes_out += len(out)
+        self._window_saved += n_in - len(out)
+        now: float = monotonic()
+        elapsed: float = now - self._window_start
+        if elapsed >= RunningStatusEncoder.WINDOW_S:
+            self.saved_per_s = self._window_saved / elapsed
+            self._window_start = now
+            self._window_saved = 0
+        return out
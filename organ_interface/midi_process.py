@@ -0,0 +1,350 @@
+from loguru import logger
+from multiprocessing import get_context
+from multiprocessing.connection import Connection
+from multiprocessing.shared_memory import SharedMemory
+from queue import Full
+from threading import Thread, Lock, Event
+from time import monotonic, sleep
+import struct
+
+from .organ import NoteEvent
+from .note_attributes import EventLane
+
+# Fixed-size records exchanged with the sender process.
+#   event: event id, target ts, enqueue ts, kind, lane, channel, 3 raw
+#          MIDI bytes. monotonic() is system-wide, so the producer's
+#          enqueue ts is valid in the sender process too.
+#   ack:   event id, result
+EVENT_RECORD: struct.Struct = struct.Struct("<QddBBB3sxx")
+ACK_RECORD: struct.Struct = struct.Struct("<QB7x")
+
+KIND_NOTE: int = 0
+KIND_STOP: int = 1
+KIND_PANIC: int = 2
+KIND_STATS: int = 3
+
+ACK_SENT: int = 0
+ACK_CANCELLED: int = 1
+
+
+class ShmRing:
+    # Single-producer/single-consumer ring of fixed-size records in shared
+    # memory. head is only written by the producer and tail only by the
+    # consumer, each on its own cache line, so the two processes never
+    # need a lock between them. Several threads on the same side must
+    # still serialise among themselves.
+    HEADER_SIZE: int = 128
+    _INDEX: struct.Struct = struct.Struct("<Q")
+    _HEAD: int = 0
+    _TAIL: int = 64
+
+    def __init__(self, record: struct.Struct, capacity: int, name: str|None=None) -> None:
+        assert capacity > 0 and capacity & (capacity - 1) == 0, f"Ring capacity {capacity} must be a power of two."
+        self._record: struct.Struct = record
+        self._capacity: int = capacity
+        self._mask: int = capacity - 1
+        self._owner: bool = name is None
+        if self._owner:
+            self._shm: SharedMemory = SharedMemory(create=True, size=ShmRing.HEADER_SIZE + capacity * record.size)
+            self._shm.buf[:ShmRing.HEADER_SIZE] = bytes(ShmRing.HEADER_SIZE)
+        else:
+            # The spawned sender shares the parent's resource tracker, so
+            # attaching here does not take ownership of the block.
+            self._shm = SharedMemory(name=name)
+        self._buf: memoryview = self._shm.buf
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    def _load(self, offset: int) -> int:
+        return ShmRing._INDEX.unpack_from(self._buf, offset)[0]
+
+    def __len__(self) -> int:
+        return self._load(ShmRing._HEAD) - self._load(ShmRing._TAIL)
+
+    def push(self, *fields: any) -> bool:
+        head: int = self._load(ShmRing._HEAD)
+        if head - self._load(ShmRing._TAIL) >= self._capacity:
+            return False
+        offset: int = ShmRing.HEADER_SIZE + (head & self._mask) * self._record.size
+        self._record.pack_into(self._buf, offset, *fields)
+        ShmRing._INDEX.pack_into(self._buf, ShmRing._HEAD, head + 1)
+        return True
+
+    def pop(self) -> tuple|None:
+        tail: int = self._load(ShmRing._TAIL)
+        if tail == self._load(ShmRing._HEAD):
+            return None
+        offset: int = ShmRing.HEADER_SIZE + (tail & self._mask) * self._record.size
+        fields: tuple = self._record.unpack_from(self._buf, offset)
+        ShmRing._INDEX.pack_into(self._buf, ShmRing._TAIL, tail + 1)
+        return fields
+
+    def close(self) -> None:
+        self._buf.release()
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
+
+class RingEvent:
+    # What the sender process sees instead of a NoteEvent: just enough for
+    # MidiOutput to route, schedule and send it, and to ack it back.
+    __slots__ = ("event_id", "ts", "lane", "channel", "raw_message", "sent", "enqueue_ts", "_ack")
+
+    def __init__(
+            self,
+            event_id: int,
+            ts: float,
+            enqueue_ts: float,
+            lane: int,
+            channel: int,
+            raw_message: bytes,
+            ack: "AckWriter"
+        ) -> None:
+        self.event_id: int = event_id
+        self.ts: float = ts
+        self.lane: EventLane = EventLane(lane)
+        self.channel: int = channel
+        self.raw_message: bytes = raw_message
+        self.sent: bool = False
+        self.enqueue_ts: float|None = enqueue_ts or None
+        self._ack: AckWriter = ack
+
+    def midi_complete(self) -> None:
+        self._ack.push(self.event_id, ACK_SENT)
+
+    def cancelled(self) -> None:
+        self._ack.push(self.event_id, ACK_CANCELLED)
+
+
+class AckWriter:
+    def __init__(self, ring: ShmRing, poll_s: float) -> None:
+        self._ring: ShmRing = ring
+        self._poll_s: float = poll_s
+        self._lock: Lock = Lock()
+
+    def push(self, event_id: int, result: int) -> None:
+        with self._lock:
+            while not self._ring.push(event_id, result):
+                sleep(self._poll_s)
+
+
+def run_sender_process(
+        config: dict[str, any],
+        event_ring_name: str,
+        ack_ring_name: str,
+        capacity: int,
+        stats_conn: Connection
+    ) -> None:
+    # Entry point of the sender process: a regular MidiOutput (with all of
+    # its shards, lanes and limits) fed from the event ring. Its latency
+    # stats go back over stats_conn, tagged with the request id, on
+    # request and once more (tagged None) on the way out.
+    from .midi_workers import MidiOutput
+
+    poll_s: float = config.get("ring_poll_ns", 100_000) / 1_000_000_000
+    events: ShmRing = ShmRing(EVENT_RECORD, capacity, name=event_ring_name)
+    acks: ShmRing = ShmRing(ACK_RECORD, capacity, name=ack_ring_name)
+    ack: AckWriter = AckWriter(acks, poll_s)
+
+    midi_output: MidiOutput = MidiOutput({**config, "out_of_process": False, "coalesce_window_ns": 0})
+    midi_output.start_midi_output_thread()
+    try:
+        while True:
+            record: tuple|None = events.pop()
+            if record is None:
+                sleep(poll_s)
+                continue
+            event_id, ts, enqueue_ts, kind, lane, channel, data = record
+            if kind == KIND_STOP:
+                break
+            if kind == KIND_PANIC:
+                midi_output.panic()
+                continue
+            if kind == KIND_STATS:
+                stats_conn.send((event_id, midi_output.latency_stats()))
+                continue
+            event: RingEvent = RingEvent(event_id, ts, enqueue_ts, lane, channel, data, ack)
+            try:
+                midi_output.put(event, block=False)
+            except Full:
+                event.cancelled()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        midi_output.stop_midi_output_thread()
+        stats_conn.send((None, midi_output.latency_stats()))
+        stats_conn.close()
+        events.close()
+        acks.close()
+
+
+class MidiProcessBridge:
+    # Main-process side of the out-of-process sender. put() writes events
+    # into the shared ring and keeps them by id until the sender process
+    # acks them, at which point the NoteEvent is completed (or cancelled)
+    # here so NoteState stays in step.
+    def __init__(self, config: dict[str, any]) -> None:
+        self._config: dict[str, any] = config
+        self._capacity: int = config.get("ring_capacity", 4096)
+        self._poll_s: float = config.get("ring_poll_ns", 100_000) / 1_000_000_000
+        self._events: ShmRing|None = None
+        self._acks: ShmRing|None = None
+        self._pending: dict[int, NoteEvent] = {}
+        self._next_id: int = 0
+        self._lock: Lock = Lock()
+        self._process = None
+        self._ack_thread: Thread|None = None
+        self._stopped: Event = Event()
+        self._stats_conn: Connection|None = None
+        self._stats_lock: Lock = Lock()
+        self._stats_seq: int = 0
+        # What the sender process reported as it exited.
+        self._final_stats: dict[str, any]|None = None
+
+    @property
+    def running(self) -> bool:
+        return self._process is not None and self._process.is_alive()
+
+    def put(self, event: NoteEvent, block: bool=True, timeout: float|None=None) -> None:
+        deadline: float|None = None if timeout is None else monotonic() + timeout
+        kind: int = KIND_NOTE
+        if event.raw_message is None:
+            event.midi_complete()
+            return
+        with self._lock:
+            # No ring before start() or after stop(): refuse it, as a full
+            # queue would.
+            if self._events is None:
+                raise Full
+            event_id: int = self._next_id
+            self._next_id += 1
+            self._pending[event_id] = event
+            while not self._events.push(
+                    event_id, event.ts, event.enqueue_ts or 0.0, kind, event.lane, event.channel, event.raw_message
+                ):
+                if not block or (deadline is not None and monotonic() >= deadline):
+                    del self._pending[event_id]
+                    raise Full
+                sleep(self._poll_s)
+
+    def put_nowait(self, event: NoteEvent) -> None:
+        self.put(event, block=False)
+
+    def qsize(self) -> int:
+        return len(self._pending)
+
+    def empty(self) -> bool:
+        return len(self._pending) == 0
+
+    def _push_control(self, kind: int, request_id: int=0) -> None:
+        with self._lock:
+            if self._events is None:
+                logger.warning(f"MIDI sender process is not running, control message {kind} dropped.")
+                return
+            while not self._events.push(request_id, 0.0, 0.0, kind, EventLane.CONTROL, 0, bytes(3)):
+                sleep(self._poll_s)
+
+    def stats(self, timeout: float=1.0) -> dict[str, any]|None:
+        # MidiOutput.latency_stats() of the sender process: asked for while
+        # it runs, the last report once it has stopped. None if it does not
+        # answer in time or never ran.
+        if not self.running:
+            return self._final_stats
+        with self._stats_lock:
+            self._stats_seq += 1
+            request_id: int = self._stats_seq
+            self._push_control(KIND_STATS, request_id)
+            deadline: float = monotonic() + timeout
+            while self._stats_conn.poll(max(0.0, deadline - monotonic())):
+                reply_id, stats = self._stats_conn.recv()
+                if reply_id == request_id:
+                    return stats
+                if reply_id is None:
+                    self._final_stats = stats
+            logger.warning(f"MIDI sender process sent no stats within {timeout}s.")
+            return None
+
+    def panic(self) -> None:
+        self._push_control(KIND_PANIC)
+
+    def send_stop_event(self) -> None:
+        self._push_control(KIND_STOP)
+
+    def _ack_listener(self) -> None:
+        while True:
+            record: tuple|None = self._acks.pop()
+            if record is None:
+                if self._stopped.is_set():
+                    return
+                sleep(self._poll_s)
+                continue
+            event_id, result = record
+            event: NoteEvent|None = self._pending.pop(event_id, None)
+            if event is None:
+                continue
+            if result == ACK_SENT:
+                event.sent = True
+                event.midi_complete()
+            else:
+                event.note_state.process_cancelled_event(event)
+
+    def start(self) -> None:
+        self._events = ShmRing(EVENT_RECORD, self._capacity)
+        self._acks = ShmRing(ACK_RECORD, self._capacity)
+        self._stopped.clear()
+        self._ack_thread = Thread(target=self._ack_listener, name="midi-acks", daemon=True)
+        self._ack_thread.start()
+        ctx = get_context("spawn")
+        self._stats_conn, stats_conn = ctx.Pipe(duplex=False)
+        self._final_stats = None
+        self._process = ctx.Process(
+            target=run_sender_process,
+            args=(self._config, self._events.name, self._acks.name, self._capacity, stats_conn),
+            name="midi-sender",
+            daemon=True
+        )
+        self._process.start()
+        stats_conn.close()
+        logger.info(f"MIDI sender process started (pid {self._process.pid})")
+
+    def stop(self, timeout: float=2.0) -> None:
+        if self._process is None:
+            return
+        if self._process.is_alive():
+            self.send_stop_event()
+        self._process.join(timeout=timeout)
+        if self._process.is_alive():
+            logger.warning("MIDI sender process did not exit, terminating it.")
+            self._process.terminate()
+        self._process = None
+        with self._stats_lock:
+            try:
+                while self._stats_conn.poll():
+                    reply_id, stats = self._stats_conn.recv()
+                    if reply_id is None:
+                        self._final_stats = stats
+            except EOFError:
+                pass
+            self._stats_conn.close()
+            self._stats_conn = None
+        # The ack thread drains what is left in the ring before exiting.
+        self._stopped.set()
+        if self._ack_thread is not None:
+            self._ack_thread.join(timeout=1.0)
+        self._ack_thread = None
+        pending, self._pending = self._pending, {}
+        for event in pending.values():
+            event.note_state.process_cancelled_event(event)
+        if pending:
+            logger.info(f"Cancelled {len(pending)} events never acked by the sender process.")
+        self._events.close()
+        self._acks.close()
+        self._events = None
+        self._acks = None
@@ -0,0 +1,138 @@
+from bisect import bisect_right
+
+from .note_attributes import EventLane
+
+# Upper bucket edges in seconds, roughly log spaced from 50 us to 1 s.
+# Anything slower lands in the last (overflow) bucket.
+LATENCY_BOUNDS_S: tuple[float, ...] = (
+    0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0,
+)
+
+DEPTH_BOUNDS: tuple[float, ...] = (0, 1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048, 4096)
+
+
+class Histogram:
+    def __init__(self, bounds: tuple[float, ...]=LATENCY_BOUNDS_S) -> None:
+        self._bounds: tuple[float, ...] = bounds
+        self._counts: list[int] = [0 for _ in range(len(bounds) + 1)]
+        self.n: int = 0
+        self.total: float = 0.0
+        self.max: float = 0.0
+
+    def record(self, value: float) -> None:
+        self._counts[bisect_right(self._bounds, value)] += 1
+        self.n += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.n if self.n else 0.0
+
+    def percentile(self, p: float) -> float:
+        # Upper edge of the bucket holding the p-th percentile.
+        if self.n == 0:
+            return 0.0
+        target: float = self.n * p / 100
+        seen: int = 0
+        for k, count in enumerate(self._counts):
+            seen += count
+            if seen >= target:
+                return min(self._bounds[k], self.max) if k < len(self._bounds) else self.max
+        return self.max
+
+    def as_dict(self) -> dict[str, any]:
+        return {
+            "n": self.n,
+            "mean": self.mean,
+            "p50": self.percentile(50),
+            "p99": self.percentile(99),
+            "max": self.max,
+            "buckets": list(zip((*self._bounds, float("inf")), self._counts)),
+        }
+
+
+class EventLatency:
+    # enqueue -> dequeue, dequeue -> wire and enqueue -> wire for one
+    # (channel, event class). late is time past the scheduled deadline.
+    def __init__(self) -> None:
+        self.wait: Histogram = Histogram()
+        self.send: Histogram = Histogram()
+        self.total: Histogram = Histogram()
+        self.late: Histogram = Histogram()
+
+    def as_dict(self) -> dict[str, dict[str, any]]:
+        return {
+            "wait": self.wait.as_dict(),
+            "send": self.send.as_dict(),
+            "total": self.total.as_dict(),
+            "late": self.late.as_dict(),
+        }
+
+
+def event_class(event: "NoteEvent") -> str:
+    return "stop" if event.lane == EventLane.STOP else "note"
+
+
+class SenderStats:
+    # Written only by the sender thread that owns it, so no locking.
+    def __init__(self) -> None:
+        self._latency: dict[tuple[int, str], EventLatency] = {}
+        self.gaps: Histogram = Histogram()
+        self.depth: Histogram = Histogram(DEPTH_BOUNDS)
+        self._last_send: float = 0.0
+
+    def record_dequeue(self, depth: int) -> None:
+        self.depth.record(depth)
+
+    def record_sent(self, event: "NoteEvent", dequeue_ts: float, send_ts: float, deadline: float|None=None) -> None:
+        key: tuple[int, str] = (event.channel, event_class(event))
+        latency: EventLatency|None = self._latency.get(key)
+        if latency is None:
+            latency = self._latency[key] = EventLatency()
+        enqueue_ts: float = event.enqueue_ts or dequeue_ts
+        latency.wait.record(dequeue_ts - enqueue_ts)
+        latency.send.record(send_ts - dequeue_ts)
+        latency.total.record(send_ts - enqueue_ts)
+        if deadline is not None:
+            latency.late.record(max(0.0, send_ts - deadline))
+        if self._last_send:
+            self.gaps.record(send_ts - self._last_send)
+        self._last_send = send_ts
+
+    def as_dict(self) -> dict[str, any]:
+        return {
+            "latency": {f"{channel}/{cls}": latency.as_dict() for (channel, cls), latency in sorted(self._latency.items())},
+            "gaps": self.gaps.as_dict(),
+            "depth": self.depth.as_dict(),
+        }
+
+    def summary(self) -> str:
+        lines: list[str] = []
+        for (channel, cls), latency in sorted(self._latency.items()):
+            lines.append(
+                f"  ch {channel:2} {cls:4}: n={latency.total.n} "
+                f"wait p50/p99/max={latency.wait.percentile(50)*1000:.2f}/{latency.wait.percentile(99)*1000:.2f}/{latency.wait.max*1000:.2f} ms "
+                f"total p99={latency.total.percentile(99)*1000:.2f} ms"
+                + (f" late p99={latency.late.percentile(99)*1000:.2f} ms" if latency.late.n else "")
+            )
+        lines.append(f"  gaps p50/p99={self.gaps.percentile(50)*1000:.2f}/{self.gaps.percentile(99)*1000:.2f} ms, depth p99={self.depth.percentile(99):.0f} max={self.depth.max:.0f}")
+        return "\n".join(lines)
+
+
+class DropCounter:
+    # Events refused by a full queue, by (channel, event class). Producers
+    # on several threads bump these; a lost increment is acceptable.
+    def __init__(self) -> None:
+        self.counts: dict[tuple[int, str], int] = {}
+
+    def record(self, event: "NoteEvent") -> None:
+        key: tuple[int, str] = (event.channel, event_class(event))
+        self.counts[key] = self.counts.get(key, 0) + 1
+
+    def as_dict(self) -> dict[str, int]:
+        return {f"{channel}/{cls}": n for (channel, cls), n in sorted(self.counts.items())}
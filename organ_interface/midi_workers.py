@@ -1,35 +1,549 @@
 from loguru import logger
-from queue import Queue, Empty
+from queue import Queue, Empty, Full
 from mido import open_output, get_output_names, Message as MidiMessage
 from mido.ports import BaseOutput
-from threading import Thread
-from time import monotonic_ns, sleep
+from threading import Thread, Lock, Event, Condition
+from collections import deque
+from time import monotonic, monotonic_ns, sleep
+import heapq
+import os
 
-from .organ import NoteEvent
+from .organ import Organ, NoteEvent, StopEvent, CHANNEL_OFFSET
+from .note_attributes import NoteAction, EventLane
+from .midi_bytes import raw_note_message, RunningStatusEncoder, CHANNEL_SILENCE_TABLE
+from .midi_process import MidiProcessBridge
+from .midi_stats import SenderStats, DropCounter
+from .helpers import sleep_until
+from .tracing import TRACER, TraceKind, trace_event
 
-class MidiOutput:
+from typing import Callable, Iterable
+
+class RawStreamPort:
+    # Writes a plain MIDI byte stream to a device node (an ALSA rawmidi
+    # device such as /dev/snd/midiC1D0, or a serial tty at 31250 baud).
+    # Unlike rtmidi, which takes whole messages, a byte stream lets us use
+    # running status and drop repeated status bytes from the wire.
+    def __init__(self, path: str, note_off_as_note_on: bool=True) -> None:
+        self._path: str = path
+        self._fd: int = os.open(path, os.O_WRONLY)
+        self._encoder: RunningStatusEncoder = RunningStatusEncoder(note_off_as_note_on)
+
+    @property
+    def encoder(self) -> RunningStatusEncoder:
+        return self._encoder
+
+    def send_raw(self, raw: bytes) -> None:
+        os.write(self._fd, self._encoder.encode(raw))
+
+    def send(self, msg: MidiMessage) -> None:
+        self.send_raw(bytes(msg.bytes()))
+
+    def panic(self) -> None:
+        for _, all_sound_off in CHANNEL_SILENCE_TABLE:
+            self.send_raw(all_sound_off)
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+    def __enter__(self) -> "RawStreamPort":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def raw_sender(port: BaseOutput|RawStreamPort) -> Callable[[bytes], None]:
+    if isinstance(port, RawStreamPort):
+        return port.send_raw
+    # mido's rtmidi backend keeps the underlying rtmidi.MidiOut as _rt, so
+    # pre-encoded bytes can go straight to it without a Message round trip.
+    rt = getattr(port, "_rt", None)
+    if rt is not None:
+        return rt.send_message
+    return lambda data: port.send(MidiMessage.from_bytes(data))
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float) -> None:
+        self._rate: float = rate
+        self._burst: float = burst
+        self._tokens: float = burst
+        self._last: float = monotonic()
+
+    @property
+    def rate(self) -> float:
+        return self._rate
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self._burst, self._tokens + (now - self._last) * self._rate)
+        self._last = now
+
+    def delay(self, n: float, now: float) -> float:
+        self._refill(now)
+        if self._tokens >= n:
+            return 0.0
+        return (n - self._tokens) / self._rate
+
+    def consume(self, n: float, now: float) -> None:
+        self._refill(now)
+        self._tokens -= n
+
+
+class LinkBudget:
+    # Byte-rate limits for one sender: a bucket for the whole port and
+    # optionally one per channel, in bytes/s on the wire. A DIN link runs
+    # at 31250 baud with 10 bits per byte, so about 3125 bytes/s.
+    #
+    # With running_status on, a message whose status byte matches the
+    # previous one is charged one byte less, which is what a serial
+    # interface applying running status will actually put on the link.
+    WINDOW_S: float = 1.0
+
+    def __init__(self, config: dict[str, any]|None) -> None:
+        config = config or {}
+        burst: float = config.get("burst_bytes", 96)
+        port_rate: float = config.get("port_bytes_per_s", 0)
+        channel_rate: float = config.get("channel_bytes_per_s", 0)
+        channel_rates: dict[int, float] = config.get("channels", {})
+        self._running_status: bool = config.get("running_status", False)
+        self._note_off_as_note_on: bool = False
+        self._port: TokenBucket|None = TokenBucket(port_rate, burst) if port_rate > 0 else None
+        self._channels: list[TokenBucket|None] = []
+        for c in range(1, 17):
+            rate: float = channel_rates.get(c, channel_rate)
+            self._channels.append(TokenBucket(rate, burst) if rate > 0 else None)
+        self._last_status: int = -1
+        self.n_bytes: int = 0
+        self.n_messages: int = 0
+        self.n_throttled: int = 0
+        self.channel_bytes: list[int] = [0 for _ in range(16)]
+        self._window_start: float = monotonic()
+        self._window_bytes: int = 0
+        self._window_channel_bytes: list[int] = [0 for _ in range(16)]
+        self.bytes_per_s: float = 0.0
+        self.channel_bytes_per_s: list[float] = [0.0 for _ in range(16)]
+
+    @property
+    def enabled(self) -> bool:
+        return self._port is not None or any(self._channels)
+
+    def note_off_as_note_on(self) -> None:
+        # The stream port rewrites note_off to note_on/0, so account for
+        # the status byte it will actually send.
+        self._note_off_as_note_on = True
+
+    def _status(self, raw: bytes) -> int:
+        if self._note_off_as_note_on and raw[0] & 0xF0 == 0x80:
+            return raw[0] | 0x10
+        return raw[0]
+
+    def wire_bytes(self, raw: bytes) -> int:
+        if self._running_status and self._status(raw) == self._last_status:
+            return len(raw) - 1
+        return len(raw)
+
+    def reset_running_status(self) -> None:
+        self._last_status = -1
+
+    def delay(self, raw: bytes, now: float) -> float:
+        n: int = self.wire_bytes(raw)
+        wait: float = 0.0
+        if self._port is not None:
+            wait = self._port.delay(n, now)
+        bucket: TokenBucket|None = self._channels[raw[0] & 0x0F]
+        if bucket is not None:
+            wait = max(wait, bucket.delay(n, now))
+        if wait > 0:
+            self.n_throttled += 1
+        return wait
+
+    def record(self, raw: bytes, now: float) -> None:
+        n: int = self.wire_bytes(raw)
+        c: int = raw[0] & 0x0F
+        if self._port is not None:
+            self._port.consume(n, now)
+        if self._channels[c] is not None:
+            self._channels[c].consume(n, now)
+        self._last_status = self._status(raw)
+        self.n_bytes += n
+        self.n_messages += 1
+        self.channel_bytes[c] += n
+        self._window_bytes += n
+        self._window_channel_bytes[c] += n
+        elapsed: float = now - self._window_start
+        if elapsed >= LinkBudget.WINDOW_S:
+            self.bytes_per_s = self._window_bytes / elapsed
+            self.channel_bytes_per_s = [b / elapsed for b in self._window_channel_bytes]
+            self._window_start = now
+            self._window_bytes = 0
+            self._window_channel_bytes = [0 for _ in range(16)]
+
+    def utilisation(self) -> dict[str, any]:
+        port_util: float|None = None
+        if self._port is not None:
+            port_util = self.bytes_per_s / self._port.rate
+        channel_util: dict[int, float] = {
+            c + 1: self.channel_bytes_per_s[c] / bucket.rate
+            for c, bucket in enumerate(self._channels) if bucket is not None
+        }
+        return {
+            "bytes": self.n_bytes,
+            "messages": self.n_messages,
+            "throttled": self.n_throttled,
+            "bytes_per_s": self.bytes_per_s,
+            "port": port_util,
+            "channels": channel_util,
+        }
+
+
+class LaneQueue:
+    # Strict-priority replacement for the sender Queue: one bounded deque
+    # per EventLane, always served lowest lane first. Each lane has its
+    # own capacity (<= 0 for unbounded) and what to do when full:
+    #   block       - behave like Queue.put (wait if block=True)
+    #   reject      - raise Full straight away
+    #   drop_oldest - cancel the oldest event in the lane to make room,
+    #                 along with the rest of its key's pending events
+    #
+    # Events for one key (channel and note) must reach the wire in the
+    # order they were queued, or a RELEASE can overtake its PRESS. So a key
+    # with events pending is pinned to the lane of the oldest of them and
+    # later events for it queue there too, whatever lane they asked for.
+    DROP_POLICIES: tuple[str, ...] = ("block", "reject", "drop_oldest")
+
+    def __init__(self, lane_config: dict[str, dict[str, any]]|None=None, default_capacity: int=0) -> None:
+        lane_config = lane_config or {}
+        self._lanes: list[deque[object]] = [deque() for _ in EventLane]
+        self._capacity: list[int] = []
+        self._policy: list[str] = []
+        for lane in EventLane:
+            cfg: dict[str, any] = lane_config.get(lane.name.lower(), {})
+            policy: str = cfg.get("drop_policy", "block")
+            assert policy in LaneQueue.DROP_POLICIES, f"Unknown drop_policy {policy} for lane {lane.name}"
+            self._capacity.append(cfg.get("capacity", default_capacity) or 0)
+            self._policy.append(policy)
+        self._n_dropped: list[int] = [0 for _ in EventLane]
+        self._size: int = 0
+        # (channel, note) -> [lane, events pending] for keys with events queued.
+        self._pinned: dict[tuple[int, int], list[int]] = {}
+        self._lock: Lock = Lock()
+        self._not_empty: Condition = Condition(self._lock)
+        self._not_full: Condition = Condition(self._lock)
+
+    @property
+    def n_dropped(self) -> dict[EventLane, int]:
+        return {lane: self._n_dropped[lane] for lane in EventLane}
+
+    @staticmethod
+    def _key(item: object) -> tuple[int, int]|None:
+        raw: bytes|None = getattr(item, "raw_message", None)
+        if raw is None or len(raw) < 2:
+            return None
+        return raw[0] & 0x0F, raw[1]
+
+    def _lane_for(self, key: tuple[int, int]|None, lane: EventLane) -> EventLane:
+        pin: list[int]|None = self._pinned.get(key) if key is not None else None
+        return lane if pin is None else EventLane(pin[0])
+
+    def _full(self, lane: EventLane) -> bool:
+        return 0 < self._capacity[lane] <= len(self._lanes[lane])
+
+    def _unpin(self, item: object) -> None:
+        key: tuple[int, int]|None = self._key(item)
+        pin: list[int]|None = self._pinned.get(key) if key is not None else None
+        if pin is None:
+            return
+        pin[1] -= 1
+        if not pin[1]:
+            del self._pinned[key]
+
+    def _evict_oldest(self, lane: EventLane) -> list[object]:
+        # The oldest event and every later one for the same key, so a
+        # PRESS never goes without its RELEASE or the other way round.
+        queue: deque[object] = self._lanes[lane]
+        key: tuple[int, int]|None = self._key(queue[0])
+        if key is None:
+            evicted: list[object] = [queue.popleft()]
+        else:
+            evicted = [item for item in queue if self._key(item) == key]
+            kept: list[object] = [item for item in queue if self._key(item) != key]
+            queue.clear()
+            queue.extend(kept)
+            self._pinned.pop(key, None)
+        self._size -= len(evicted)
+        self._n_dropped[lane] += len(evicted)
+        return evicted
+
+    def put(self, item: object, block: bool=True, timeout: float|None=None, lane: EventLane|None=None) -> None:
+        if lane is None:
+            lane = item.lane
+        # Control items are never held back behind anything.
+        key: tuple[int, int]|None = self._key(item) if lane != EventLane.CONTROL else None
+        evicted: list[object] = []
+        with self._lock:
+            target: EventLane = self._lane_for(key, lane)
+            if self._full(target):
+                policy: str = self._policy[target]
+                if policy == "reject" or (policy == "block" and not block):
+                    self._n_dropped[target] += 1
+                    raise Full
+                if policy == "drop_oldest":
+                    evicted = self._evict_oldest(target)
+                elif not self._not_full.wait_for(lambda: not self._full(self._lane_for(key, lane)), timeout):
+                    self._n_dropped[target] += 1
+                    raise Full
+                else:
+                    target = self._lane_for(key, lane)
+            self._lanes[target].append(item)
+            self._size += 1
+            if key is not None:
+                pin: list[int]|None = self._pinned.get(key)
+                if pin is None:
+                    self._pinned[key] = [target, 1]
+                else:
+                    pin[1] += 1
+            self._not_empty.notify()
+        # Newest first, so each cancel undoes the queued count it added.
+        for event in reversed(evicted):
+            event.cancelled()
+
+    def put_nowait(self, item: object) -> None:
+        self.put(item, block=False)
+
+    def put_control(self, item: object) -> None:
+        self.put(item, block=False, lane=EventLane.CONTROL)
+
+    def _pop(self) -> object:
+        for lane in self._lanes:
+            if lane:
+                self._size -= 1
+                # Waiters on every lane share the condition, so wake them
+                # all; only the one on this lane finds room.
+                self._not_full.notify_all()
+                item: object = lane.popleft()
+                self._unpin(item)
+                return item
+        raise Empty
+
+    def get(self, block: bool=True, timeout: float|None=None) -> object:
+        with self._lock:
+            if block and not self._not_empty.wait_for(lambda: self._size > 0, timeout):
+                raise Empty
+            return self._pop()
+
+    def get_nowait(self) -> object:
+        return self.get(block=False)
+
+    def clear(self) -> list[object]:
+        with self._lock:
+            items: list[object] = [item for lane in self._lanes for item in lane]
+            for lane in self._lanes:
+                lane.clear()
+            self._size = 0
+            self._pinned.clear()
+            self._not_full.notify_all()
+        return items
+
+    def empty(self) -> bool:
+        return self._size == 0
+
+    def qsize(self) -> int:
+        return self._size
+
+
+class EventCoalescer:
+    # Sits in front of the sender queue and holds note events for one
+    # window before forwarding them. A PRESS that is RELEASEd again within
+    # the window never reaches the wire; for a sweeping voice that leaves
+    # only the RELEASE of the old note and the PRESS of the newest one.
+    # Stop events are passed through untouched.
+    def __init__(self, queue: Queue[object], window_s: float, maxsize: int=0, drops: DropCounter|None=None) -> None:
+        self._queue: Queue[object] = queue
+        self._drops: DropCounter = drops or DropCounter()
+        self._window_s: float = window_s
+        self._maxsize: int = maxsize
+        self._lock: Lock = Lock()
+        self._buffer: list[NoteEvent|None] = []
+        self._pending_press: dict[tuple["Register", "NoteName"], int] = {}
+        self._n_elided: int = 0
+        self._stopped: Event = Event()
+        self._thread: Thread|None = None
+
+    @property
+    def n_elided(self) -> int:
+        return self._n_elided
+
+    def put(self, event: NoteEvent, block: bool=True, timeout: float|None=None) -> None:
+        elided: tuple[NoteEvent, NoteEvent]|None = None
+        event.enqueue_ts = monotonic()
+        with self._lock:
+            if self._maxsize > 0 and len(self._buffer) >= self._maxsize:
+                self._drops.record(event)
+                raise Full
+            if isinstance(event, StopEvent):
+                self._buffer.append(event)
+                return
+            key = (event.register, event.name)
+            if event.action == NoteAction.RELEASE and key in self._pending_press:
+                idx: int = self._pending_press.pop(key)
+                elided = (self._buffer[idx], event)
+                self._buffer[idx] = None
+            else:
+                if event.action == NoteAction.PRESS:
+                    self._pending_press[key] = len(self._buffer)
+                self._buffer.append(event)
+
+        if elided is not None:
+            # Both sides still count as played so NoteState stays balanced.
+            self._n_elided += 2
+            for e in elided:
+                e.midi_complete()
+
+    def put_nowait(self, event: NoteEvent) -> None:
+        self.put(event, block=False)
+
+    def empty(self) -> bool:
+        return self.qsize() == 0
+
+    def qsize(self) -> int:
+        return len(self._buffer) + self._queue.qsize()
+
+    def flush(self) -> None:
+        with self._lock:
+            buffer, self._buffer = self._buffer, []
+            self._pending_press.clear()
+        for event in buffer:
+            if event is None:
+                continue
+            try:
+                self._queue.put(event, block=False)
+            except Full:
+                event.cancelled()
+
+    def clear(self) -> None:
+        with self._lock:
+            buffer, self._buffer = self._buffer, []
+            self._pending_press.clear()
+        for event in buffer:
+            if event is not None:
+                event.cancelled()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self._window_s):
+            self.flush()
+        self.flush()
+
+    def start(self) -> None:
+        self._stopped.clear()
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+        self._thread = None
+
+
+class MidiSender:
+    # One port, one queue, one thread. MidiOutput runs one of these per
+    # shard and routes events to them by channel.
     STOP_EVENT: object = object()
+    PANIC_EVENT: object = object()
 
-    def __init__(self, config: dict[str, any]) -> None:
+    def __init__(self, config: dict[str, any], name: str="main") -> None:
         self._config: dict[str, any] = config
-        self._port_name: str
+        self._name: str = name
+        self._port_name: str|None = None
         self._magic_assign_midi_port()
-        self._stop_event: type(MidiOutput.STOP_EVENT) = MidiOutput.STOP_EVENT
-        self._queue: Queue[object] = Queue(maxsize=config.get("queue_size"))
+        self._stop_event: type(MidiSender.STOP_EVENT) = MidiSender.STOP_EVENT
+        self._queue: LaneQueue = LaneQueue(config.get("lanes"), default_capacity=config.get("queue_size") or 0)
         self._min_gap_ns = config.get('min_gap_ns')
+        self._scheduled: bool = config.get("scheduled", False)
+        self._schedule_latency_s: float = config.get("schedule_latency_ns", 0) / 1_000_000_000
+        self._spin_s: float = config.get("spin_ns", 1_000_000) / 1_000_000_000
         self._thread: Thread|None = None
+        self._budget: LinkBudget = LinkBudget(config.get("rate_limit"))
+        self._stats: SenderStats = SenderStats()
+        self._stream_device: str|None = config.get("raw_stream_device")
+        self._reorder_ticks: bool = config.get("reorder_ticks", False)
+        self._stream_port: RawStreamPort|None = None
+        self._note_off_as_note_on: bool = config.get("note_off_as_note_on", True)
+        if self._stream_device is not None:
+            self._port_name = self._stream_device
+            if self._note_off_as_note_on:
+                self._budget.note_off_as_note_on()
+        self._channels: list[int] = []
+        self._sounding: Callable[[], Iterable[bytes]] = lambda: ()
+
+    def _open_port(self) -> BaseOutput|RawStreamPort:
+        if self._stream_device is not None:
+            return RawStreamPort(self._stream_device, self._note_off_as_note_on)
+        return open_output(self._port_name)
 
     def _magic_assign_midi_port(self) -> None:
+        if self._config.get("raw_stream_device") is not None:
+            return
         for port_str in get_output_names():
             if any(name in port_str for name in self._config.get("midi_interface_names", [])):
                 self._port_name = port_str
                 return
+        logger.warning(
+            f"Shard '{self._name}': no MIDI output matches {self._config.get('midi_interface_names', [])}, "
+            f"using the default output."
+        )
 
     @property
-    def queue(self) -> Queue[object]:
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def port_name(self) -> str|None:
+        return self._port_name
+
+    @property
+    def queue(self) -> LaneQueue:
         return self._queue
 
+    @property
+    def budget(self) -> LinkBudget:
+        return self._budget
+
+    @property
+    def stats(self) -> SenderStats:
+        return self._stats
+
+    def stream_stats(self) -> dict[str, float]|None:
+        if self._stream_port is None:
+            return None
+        encoder: RunningStatusEncoder = self._stream_port.encoder
+        return {
+            "bytes_in": encoder.n_bytes_in,
+            "bytes_out": encoder.n_bytes_out,
+            "bytes_saved": encoder.bytes_saved,
+            "saved_per_s": encoder.saved_per_s,
+        }
+
+    def assign_channels(self, channels: list[int], sounding: Callable[[], Iterable[bytes]]) -> None:
+        self._channels = channels
+        self._sounding = sounding
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
     def panic(self, port: BaseOutput|None=None) -> None:
+        if port is None and self.running:
+            # Let the running sender do it on its own port. What was
+            # queued is dropped rather than sounded after the panic.
+            pending: list[object] = self._queue.clear()
+            self._cancel_pending(pending)
+            try:
+                if self._stop_event in pending:
+                    self._queue.put_control(self._stop_event)
+                self._queue.put_control(MidiSender.PANIC_EVENT)
+                return
+            except Full:
+                pass
         if port is not None:
             try: 
                 port.panic()
@@ -39,42 +553,164 @@ class MidiOutput:
             except Exception as e:
                 logger.warning(f"panic() failed: {e}")
                 pass
-        with open_output(self._port_name) as tmp_port:
+        with self._open_port() as tmp_port:
             tmp_port.panic()
 
-    def send_note_off_all(self) -> None:
-        logger.info("Sending note_off to all notes on all channels.")
-        with open_output(self._port_name) as tmp_port:           
-            for c in range(0, 16):
-                for n in range(0, 127):
-                    midi_message = MidiMessage(
-                        type = 'note_off',
-                        note = n,
-                        velocity = 127,
-                        channel = c
-                    )
-                    tmp_port.send(midi_message)
+    def _send_note_off_sweep(self, port: BaseOutput) -> None:
+        logger.info(f"Sending note_off to all notes on all channels of {self._port_name}.")
+        for c in range(0, 16):
+            for n in range(0, 127):
+                midi_message = MidiMessage(
+                    type = 'note_off',
+                    note = n,
+                    velocity = 127,
+                    channel = c
+                )
+                port.send(midi_message)
 
-    def send_stop_event(self) -> None:
-        logger.info("Sending STOP event to MidiOutput")
+    def _send_silence(self, port: BaseOutput) -> None:
+        # All Notes Off / All Sound Off on our channels, then a note_off
+        # for whatever the organ state says is still sounding in case the
+        # interface ignores channel mode messages.
+        send_raw: Callable[[bytes], None] = raw_sender(port)
+        n_sent: int = 0
+        for c in self._channels:
+            for raw in CHANNEL_SILENCE_TABLE[c - CHANNEL_OFFSET]:
+                send_raw(raw)
+                n_sent += 1
+        for raw in self._sounding():
+            send_raw(raw)
+            n_sent += 1
+        logger.info(f"Silenced {self._port_name} with {n_sent} messages.")
 
-        try:
-            while True:
-                self._queue.get_nowait()
-        except Empty:
-            pass
+    def send_note_off_all(self, port: BaseOutput|None=None) -> None:
+        # One silence pass over the shard's channels; it covers what
+        # panic() sends, so the two are never needed together.
+        if port is None:
+            with self._open_port() as tmp_port:
+                self.send_note_off_all(tmp_port)
+            return
+        self._send_silence(port)
+        if self._config.get("full_note_off_sweep", False):
+            self._send_note_off_sweep(port)
+
+    def send_stop_event(self) -> None:
+        logger.info(f"Sending STOP event to MidiSender '{self._name}'")
 
         try:
-            self._queue.put(self._stop_event, block=False)
+            self._queue.put_control(self._stop_event)
         except Full:
             logger.warning("Queue full when sending STOP. Panic() instead.")
             self.panic()
 
+    def _scheduled_listener(self, port: BaseOutput) -> None:
+        # Events are held in a min-heap keyed on their target send time
+        # (NoteEvent.ts + latency) and released on the deadline. Equal
+        # deadlines go by lane, then seq keeps them in FIFO order. With
+        # reorder_ticks, events in the same tick are also grouped by
+        # channel so they can share a running status byte.
+        heap: list[tuple[float, int, int, int, NoteEvent]] = []
+        reorder: bool = self._reorder_ticks
+        seq: int = 0
+        min_gap_s: float = (self._min_gap_ns or 0) / 1_000_000_000
+        latency_s: float = self._schedule_latency_s
+        spin_s: float = self._spin_s
+        send_raw: Callable[[bytes], None] = raw_sender(port)
+        budget: LinkBudget = self._budget
+        stats: SenderStats = self._stats
+        last_send: float = 0.0
+
+        while True:
+            timeout: float = 0.5
+            if heap:
+                timeout = heap[0][0] - monotonic() - spin_s
+            if timeout > 0:
+                try:
+                    msg: NoteEvent|type(MidiSender.STOP_EVENT) = self._queue.get(timeout=timeout)
+                except Empty:
+                    continue
+                if msg is self._stop_event:
+                    logger.info("STOP event received.")
+                    break
+                if msg is MidiSender.PANIC_EVENT:
+                    port.panic()
+                    budget.reset_running_status()
+                    continue
+                heapq.heappush(heap, (msg.ts + latency_s, msg.lane, msg.channel if reorder else 0, seq, msg))
+                seq += 1
+                continue
+
+            # Pick up anything that arrived meanwhile; it may be due earlier.
+            stopping: bool = False
+            try:
+                while True:
+                    msg = self._queue.get_nowait()
+                    if msg is self._stop_event:
+                        stopping = True
+                        break
+                    if msg is MidiSender.PANIC_EVENT:
+                        port.panic()
+                        budget.reset_running_status()
+                        continue
+                    heapq.heappush(heap, (msg.ts + latency_s, msg.lane, msg.channel if reorder else 0, seq, msg))
+                    seq += 1
+            except Empty:
+                pass
+            if stopping:
+                logger.info("STOP event received.")
+                break
+
+            deadline, *_, msg = heapq.heappop(heap)
+            dequeue_ts: float = monotonic()
+            stats.record_dequeue(len(heap) + self._queue.qsize())
+            if TRACER.enabled:
+                trace_event(TraceKind.DEQUEUE, msg)
+            if msg.raw_message is None:
+                if TRACER.enabled:
+                    trace_event(TraceKind.DROP, msg)
+                msg.midi_complete()
+                continue
+            target: float = deadline
+            deadline = max(deadline, last_send + min_gap_s)
+            if budget.enabled:
+                now: float = monotonic()
+                deadline = max(deadline, now + budget.delay(msg.raw_message, now))
+            sleep_until(deadline, spin_s)
+            send_raw(msg.raw_message)
+            last_send = monotonic()
+            if TRACER.enabled:
+                trace_event(TraceKind.SEND, msg)
+            budget.record(msg.raw_message, last_send)
+            stats.record_sent(msg, dequeue_ts, last_send, target)
+            msg.sent = True
+            msg.midi_complete()
+
+        # Anything still pending is dropped, so undo its queued counts.
+        self._cancel_pending(msg for *_, msg in heap)
+
+    def _cancel_pending(self, pending: Iterable[object]) -> None:
+        n_cancelled: int = 0
+        for msg in pending:
+            if isinstance(msg, NoteEvent):
+                msg.note_state.process_cancelled_event(msg)
+                n_cancelled += 1
+        if n_cancelled:
+            logger.info(f"MIDI sender '{self._name}' cancelled {n_cancelled} pending events.")
+
     def midi_listener(self) -> None:
-        with open_output(self._port_name) as port:
+        with self._open_port() as port:
+            if isinstance(port, RawStreamPort):
+                self._stream_port = port
             try:
+                if self._scheduled:
+                    self._scheduled_listener(port)
+                    return
+
                 
                 ns_per_s: int= 1_000_000_000
+                send_raw: Callable[[bytes], None] = raw_sender(port)
+                budget: LinkBudget = self._budget
+                stats: SenderStats = self._stats
                 min_gap_ns: int = self._min_gap_ns
                 last_send_ts: int = 0
                 now: int = monotonic_ns()
@@ -82,16 +718,24 @@ class MidiOutput:
 
                 while True:
                     try:
-                        msg: NoteEvent|type(MidiOutput.STOP_EVENT) = self._queue.get(timeout=0.5)
+                        msg: NoteEvent|type(MidiSender.STOP_EVENT) = self._queue.get(timeout=0.5)
                     except Empty:
                         continue
-                    logger.debug(f"Message received: {msg}")
-                    
+                    dequeue_ts: float = monotonic()
+                    stats.record_dequeue(self._queue.qsize())
+
                     if msg is self._stop_event:
                         logger.info("STOP event received.")
                         break
-                    if msg.midi_message is None:
-                        logger.debug(f"DROPPED {msg}")
+                    if msg is MidiSender.PANIC_EVENT:
+                        port.panic()
+                        budget.reset_running_status()
+                        continue
+                    if TRACER.enabled:
+                        trace_event(TraceKind.DEQUEUE, msg)
+                    if msg.raw_message is None:
+                        if TRACER.enabled:
+                            trace_event(TraceKind.DROP, msg)
                         msg.midi_complete()
                         continue
                     #logger.debug(f"SENDING <{msg.midi_message}> to {port}")
@@ -101,33 +745,233 @@ class MidiOutput:
                     now = monotonic_ns()
                     delta = now - last_send_ts
                     sleep(max(0, (min_gap_ns - delta) / ns_per_s))
-                    
-                    port.send(msg.midi_message)
+
+                    if budget.enabled:
+                        t: float = monotonic()
+                        sleep_until(t + budget.delay(msg.raw_message, t), self._spin_s)
+
+                    send_raw(msg.raw_message)
                     
                     last_send_ts = monotonic_ns()
+                    if TRACER.enabled:
+                        trace_event(TraceKind.SEND, msg)
+                    budget.record(msg.raw_message, last_send_ts / ns_per_s)
+                    stats.record_sent(msg, dequeue_ts, last_send_ts / ns_per_s)
 
                     msg.midi_complete()
 
             except (KeyboardInterrupt, SystemExit, OSError, IOError):
-                logger.info("MIDI sender interrupted")
-                port.panic()
+                logger.info(f"MIDI sender '{self._name}' interrupted")
             finally:
-                logger.info("MIDI sender exiting")
-                port.panic()
-        self.send_note_off_all()
+                logger.info(f"MIDI sender '{self._name}' exiting, latency:\n{self._stats.summary()}")
+                if self._stream_port is not None:
+                    logger.info(f"Running status saved {self._stream_port.encoder.bytes_saved} of {self._stream_port.encoder.n_bytes_in} bytes.")
+                self._cancel_pending(self._queue.clear())
+                self.send_note_off_all(port)
 
-    def start_midi_output_thread(self) -> None:
-        self.panic()
-        self.send_note_off_all()
-        self._thread: Thread = Thread(target=self.midi_listener, daemon=True)
+    def start_thread(self) -> None:
+        self._thread = Thread(target=self.midi_listener, name=f"midi-{self._name}", daemon=True)
         self._thread.start()
 
-        
-    def stop_midi_output_thread(self) -> None:
-        self.send_stop_event()
+    def join_thread(self, timeout: float=1.0) -> None:
         if self._thread is not None:
-            self._thread.join(timeout=1.0)
+            self._thread.join(timeout=timeout)
         self._thread = None
-        self.panic()
+
+    def stop_thread(self) -> None:
+        self.send_stop_event()
+        self.join_thread()
+
+    def __repr__(self) -> str:
+        return f"<MidiSender '{self._name}' on {self._port_name}>"
+
+
+class MidiOutput:
+    # Front end for one or more MidiSender shards. Without a "shards"
+    # section in the config there is a single shard carrying every
+    # channel, which behaves exactly like the old single-thread output.
+    STOP_EVENT: object = MidiSender.STOP_EVENT
+
+    def __init__(self, config: dict[str, any], organ: Organ|None=None) -> None:
+        self._config: dict[str, any] = config
+        self._organ: Organ|None = organ
+        self._senders: list[MidiSender] = []
+        self._routes: dict[int, MidiSender] = {}
+        self._drops: DropCounter = DropCounter()
+        self._load_shards()
+        # Out of process, the senders above are only used from here for
+        # panic/silence while the sender process is not running.
+        self._bridge: MidiProcessBridge|None = None
+        if config.get("out_of_process", False):
+            self._bridge = MidiProcessBridge(config)
+        self._coalescer: EventCoalescer|None = None
+        if config.get("coalesce_window_ns", 0) > 0:
+            self._coalescer = EventCoalescer(
+                self,
+                config["coalesce_window_ns"] / 1_000_000_000,
+                maxsize=config.get("queue_size") or 0,
+                drops=self._drops
+            )
+
+    def _load_shards(self) -> None:
+        shard_configs: list[dict[str, any]] = self._config.get("shards") or [{"name": "main"}]
+        base: dict[str, any] = {k: v for k, v in self._config.items() if k != "shards"}
+        for shard_cfg in shard_configs:
+            sender_cfg: dict[str, any] = {**base, **shard_cfg}
+            sender: MidiSender = MidiSender(sender_cfg, name=shard_cfg.get("name", f"shard-{len(self._senders)}"))
+            self._senders.append(sender)
+            for channel in shard_cfg.get("channels", []):
+                assert channel in range(1, 17), f"Midi Channel, {channel} is out of bounds [1,16]."
+                assert channel not in self._routes, f"Midi Channel {channel} is routed to more than one shard."
+                self._routes[channel] = sender
+        # A port takes one shard: two would open it twice (single-client
+        # drivers refuse) and each would budget the link as its own. Shards
+        # that matched no interface are left out; they warned already.
+        ports: dict[str, str] = {}
+        for sender in self._senders:
+            if sender.port_name is None:
+                continue
+            assert sender.port_name not in ports, \
+                f"Shards '{ports.get(sender.port_name)}' and '{sender.name}' both use port {sender.port_name}."
+            ports[sender.port_name] = sender.name
+        # Anything not routed explicitly goes to the first shard.
+        for channel in range(1, 17):
+            self._routes.setdefault(channel, self._senders[0])
+        for sender in self._senders:
+            channels: list[int] = [c for c, s in self._routes.items() if s is sender]
+            sender.assign_channels(channels, lambda sender=sender: self._sounding_messages(sender))
+            logger.info(f"{sender}: channels {channels}")
+
+    def _sounding_messages(self, sender: MidiSender) -> list[bytes]:
+        if self._organ is None:
+            return []
+        return [
+            raw_note_message(NoteAction.RELEASE, channel - CHANNEL_OFFSET, note)
+            for channel, note in self._organ.sounding_keys()
+            if self._routes[channel] is sender
+        ]
+
+    @property
+    def senders(self) -> list[MidiSender]:
+        return self._senders
+
+    @property
+    def queue(self) -> "MidiOutput|EventCoalescer":
+        if self._coalescer is not None:
+            return self._coalescer
+        return self
+
+    def link_stats(self) -> dict[str, dict[str, any]]:
+        stats: dict[str, dict[str, any]] = {}
+        for sender in self._senders:
+            stats[sender.name] = sender.budget.utilisation()
+            stats[sender.name]["stream"] = sender.stream_stats()
+        return stats
+
+    def latency_stats(self) -> dict[str, any]:
+        # Out of process the histograms are fetched from the sender process;
+        # the drops and elisions counted here are added on top.
+        if self._bridge is not None:
+            return self._remote_latency_stats()
+        return {
+            "senders": {sender.name: sender.stats.as_dict() for sender in self._senders},
+            "lane_drops": {sender.name: {lane.name: n for lane, n in sender.queue.n_dropped.items()} for sender in self._senders},
+            "drops": self._drops.as_dict(),
+            "elided": self._coalescer.n_elided if self._coalescer is not None else 0,
+        }
+
+    def _remote_latency_stats(self) -> dict[str, any]:
+        elided: int = self._coalescer.n_elided if self._coalescer is not None else 0
+        remote: dict[str, any]|None = self._bridge.stats()
+        if remote is None:
+            return {
+                "process": "sender",
+                "error": "Sender stats live in the sender process, which did not report them.",
+                "drops": self._drops.as_dict(),
+                "elided": elided,
+            }
+        return {
+            **remote,
+            "process": "sender",
+            "drops": self._drops.as_dict(),
+            "sender_drops": remote["drops"],
+            "elided": elided,
+        }
+
+    def put(self, event: NoteEvent, block: bool=True, timeout: float|None=None) -> None:
+        if event.enqueue_ts is None:
+            event.enqueue_ts = monotonic()
+        try:
+            if self._bridge is not None:
+                self._bridge.put(event, block, timeout)
+                return
+            self._routes[event.channel].queue.put(event, block, timeout)
+        except Full:
+            self._drops.record(event)
+            raise
+
+    def put_nowait(self, event: NoteEvent) -> None:
+        self.put(event, block=False)
+
+    def empty(self) -> bool:
+        if self._bridge is not None:
+            return self._bridge.empty()
+        return all(sender.queue.empty() for sender in self._senders)
+
+    def qsize(self) -> int:
+        if self._bridge is not None:
+            return self._bridge.qsize()
+        return sum(sender.queue.qsize() for sender in self._senders)
+
+    def _reset_state(self) -> None:
+        # Everything was just silenced on the wire; the organ state must
+        # not go on reporting keys and stops as sounding.
+        if self._organ is not None:
+            self._organ.store.reset()
+
+    def panic(self) -> None:
+        if self._bridge is not None and self._bridge.running:
+            self._bridge.panic()
+        else:
+            for sender in self._senders:
+                sender.panic()
+        self._reset_state()
+
+    def send_note_off_all(self) -> None:
+        for sender in self._senders:
+            sender.send_note_off_all()
+        self._reset_state()
+
+    def send_stop_event(self) -> None:
+        if self._coalescer is not None:
+            self._coalescer.stop()
+            self._coalescer.clear()
+        if self._bridge is not None:
+            self._bridge.stop()
+            return
+        for sender in self._senders:
+            sender.send_stop_event()
+
+    def start_midi_output_thread(self) -> None:
         self.send_note_off_all()
-        
+        if self._bridge is not None:
+            self._bridge.start()
+        else:
+            for sender in self._senders:
+                sender.start_thread()
+        if self._coalescer is not None:
+            self._coalescer.start()
+
+    def stop_midi_output_thread(self) -> None:
+        # A running shard silences its own port on the way out (so does
+        # the sender process); only the others get a silence pass here.
+        bridged: bool = self._bridge is not None and self._bridge.running
+        idle: list[MidiSender] = [sender for sender in self._senders if not sender.running]
+        # Signal every shard first so they wind down in parallel.
+        self.send_stop_event()
+        for sender in self._senders:
+            sender.join_thread()
+        if not bridged:
+            for sender in idle:
+                sender.send_note_off_all()
+        self._reset_state()
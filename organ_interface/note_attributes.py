@@ -1,5 +1,5 @@
 from loguru import logger
-from enum import Enum
+from enum import Enum, IntEnum
 
 from typing import Iterator
 
@@ -13,6 +13,13 @@ class NoteAction(Enum):
         self.midi_message = midi_message
         self.delta = delta
 
+class EventLane(IntEnum):
+    # Sender priority, lowest value is served first.
+    CONTROL = 0
+    STOP = 1
+    INTERACTIVE = 2
+    BULK = 3
+
 ############################
 # Create the NoteName Enum #
 ############################
@@ -0,0 +1,84 @@
+import numpy as np
+
+from dataclasses import dataclass
+from time import monotonic
+
+N_MIDI_NOTES: int = 128
+
+# Planes of the store: key presses and stop (registration) toggles share a
+# layout so both can be queried the same way.
+NOTES: int = 0
+STOPS: int = 1
+N_PLANES: int = 2
+
+
+@dataclass(frozen=True)
+class StateSnapshot:
+    # Immutable copy of a NoteStateStore at one moment.
+    queued: np.ndarray
+    actual: np.ndarray
+    ts: float
+
+    def sounding(self, plane: int=NOTES) -> np.ndarray:
+        return self.actual[plane] > 0
+
+    def queue_active(self, plane: int=NOTES) -> np.ndarray:
+        return self.queued[plane] > 0
+
+
+class NoteStateStore:
+    # Struct-of-arrays state for a whole organ, indexed plane x register x
+    # MIDI note. Every NoteState is a view onto one flat slot here, so
+    # whole-organ questions ("what is sounding?") are single array ops.
+    def __init__(self, n_registers: int) -> None:
+        self._n_registers: int = n_registers
+        shape: tuple[int, int, int] = (N_PLANES, n_registers, N_MIDI_NOTES)
+        self.queued: np.ndarray = np.zeros(shape, dtype=np.int16)
+        self.actual: np.ndarray = np.zeros(shape, dtype=np.int16)
+        self.last_ts: np.ndarray = np.full(shape, monotonic(), dtype=np.float64)
+        # Flat views for the per-event path; they share memory with the above.
+        self.queued_flat: np.ndarray = self.queued.reshape(-1)
+        self.actual_flat: np.ndarray = self.actual.reshape(-1)
+        self.last_ts_flat: np.ndarray = self.last_ts.reshape(-1)
+        self.channels: np.ndarray = np.zeros((N_PLANES, n_registers), dtype=np.int8)
+
+    @property
+    def n_registers(self) -> int:
+        return self._n_registers
+
+    def index(self, plane: int, register: int, note: int) -> int:
+        return (plane * self._n_registers + register) * N_MIDI_NOTES + note
+
+    def set_channel(self, plane: int, register: int, channel: int) -> None:
+        self.channels[plane, register] = channel
+
+    # The queries below are called from the song, control and sender
+    # threads alike, so they never share a buffer: the result is a new
+    # array unless the caller passes one of its own as out.
+    def active_mask(self, plane: int=NOTES, out: np.ndarray|None=None) -> np.ndarray:
+        return np.greater(self.actual[plane], 0, out=out)
+
+    def queued_mask(self, plane: int=NOTES, out: np.ndarray|None=None) -> np.ndarray:
+        return np.greater(self.queued[plane], 0, out=out)
+
+    def active_counts(self, plane: int=NOTES, out: np.ndarray|None=None) -> np.ndarray:
+        # Number of sounding notes (or pulled stops) per register.
+        return np.sum(self.active_mask(plane), axis=1, out=out)
+
+    def active_keys(self, plane: int=NOTES) -> list[tuple[int, int]]:
+        # (channel, midi note) for everything sounding on a plane.
+        registers, notes = np.nonzero(self.active_mask(plane))
+        channels: np.ndarray = self.channels[plane, registers]
+        return list(zip(channels.tolist(), notes.tolist()))
+
+    def snapshot(self) -> StateSnapshot:
+        queued: np.ndarray = self.queued.copy()
+        actual: np.ndarray = self.actual.copy()
+        queued.flags.writeable = False
+        actual.flags.writeable = False
+        return StateSnapshot(queued, actual, monotonic())
+
+    def reset(self) -> None:
+        self.queued.fill(0)
+        self.actual.fill(0)
+        self.last_ts.fill(monotonic())
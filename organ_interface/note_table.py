@@ -0,0 +1,91 @@
+import numpy as np
+
+from .note_attributes import NoteName, get_note_name, note_name_range, _NOTE_NAMES
+
+N_PITCH_CLASSES: int = 12
+
+
+def pitch_class_key(pitch_classes: list[str]) -> int:
+    # 12-bit set of pitch classes, e.g. ["C", "E", "G"] -> 0b000010010001.
+    key: int = 0
+    for pc in pitch_classes:
+        key |= 1 << _NOTE_NAMES.index(pc)
+    return key
+
+
+class NoteTable:
+    # Immutable index of a register's contiguous note range, built once.
+    # Positions, ranges and pitch-class subsets are lookups rather than
+    # scans; the arrays are read-only and handed out without copying.
+    def __init__(self, low: NoteName, high: NoteName) -> None:
+        self._low: int = low.value
+        self._high: int = high.value
+        self._names: tuple[NoteName, ...] = tuple(note_name_range(low, high))
+        self._numbers: np.ndarray = np.arange(self._low, self._high + 1, dtype=np.int16)
+        self._numbers.flags.writeable = False
+        # MIDI number -> position in the table, -1 outside it.
+        self._positions: tuple[int, ...] = tuple(
+            n - self._low if self._low <= n <= self._high else -1 for n in range(128)
+        )
+        masks: np.ndarray = np.zeros((N_PITCH_CLASSES, len(self._names)), dtype=bool)
+        masks[self._numbers % N_PITCH_CLASSES, np.arange(len(self._names))] = True
+        masks.flags.writeable = False
+        self._pitch_class_masks: np.ndarray = masks
+        self._subsets: dict[int, tuple[NoteName, ...]] = {}
+
+    @property
+    def names(self) -> tuple[NoteName, ...]:
+        return self._names
+
+    @property
+    def numbers(self) -> np.ndarray:
+        return self._numbers
+
+    @property
+    def pitch_class_masks(self) -> np.ndarray:
+        return self._pitch_class_masks
+
+    @property
+    def lowest(self) -> NoteName:
+        return self._names[0]
+
+    @property
+    def highest(self) -> NoteName:
+        return self._names[-1]
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def __contains__(self, note_name: NoteName) -> bool:
+        return self._low <= note_name.value <= self._high
+
+    def position(self, note_name: NoteName) -> int:
+        return self._positions[note_name.value] if note_name.value >= 0 else -1
+
+    def name_at(self, position: int) -> NoteName:
+        return self._names[position]
+
+    def span(self, first: NoteName, last: NoteName) -> tuple[NoteName, ...]:
+        # Same result as note_name_range(first, last), descending included;
+        # equal endpoints and notes outside the table go through it.
+        i: int = self.position(first)
+        j: int = self.position(last)
+        if i < 0 or j < 0 or i == j:
+            return tuple(note_name_range(first, last))
+        if i <= j:
+            return self._names[i:j + 1]
+        return self._names[j:i + 1][::-1]
+
+    def pitch_class_mask(self, pitch_classes: list[str]) -> np.ndarray:
+        key: int = pitch_class_key(pitch_classes)
+        rows: list[int] = [pc for pc in range(N_PITCH_CLASSES) if key & (1 << pc)]
+        return np.any(self._pitch_class_masks[rows], axis=0)
+
+    def subset(self, pitch_classes: list[str]) -> tuple[NoteName, ...]:
+        # Notes of the register in the given pitch classes, cached per set.
+        key: int = pitch_class_key(pitch_classes)
+        subset: tuple[NoteName, ...]|None = self._subsets.get(key)
+        if subset is None:
+            mask: np.ndarray = self.pitch_class_mask(pitch_classes)
+            subset = self._subsets[key] = tuple(get_note_name(n) for n in self._numbers[mask].tolist())
+        return subset
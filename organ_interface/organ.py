@@ -5,12 +5,21 @@ import random
 import time
 
 from typing import Optional, Iterator
+from queue import Full
 
 from functools import total_ordering
+from pathlib import Path
 from time import monotonic
 
-from .note_attributes import NoteName, NoteAction, get_note_name, note_name_range
+from .note_attributes import NoteName, NoteAction, EventLane, get_note_name, note_name_range
 from .helpers import clamp_int, clamp_float
+from .midi_bytes import raw_note_message
+from .note_store import NoteStateStore, StateSnapshot, NOTES, STOPS
+from .organ_cache import load_organ_config, VOICE_BUDGET
+from .tracing import TRACER, TraceKind
+from .note_table import NoteTable
+
+import numpy as np
 #from .stops import Stop
 
 MAX_ACTIVATIONS: int = 5
@@ -18,44 +27,65 @@ CHANNEL_OFFSET: int = 1
 
 
 
-@dataclass
 class NoteEvent:
-    note: "Note"
-    action: NoteAction
-    queued: bool=False
-    sent: bool=False
-    ts: float = field(default_factory=monotonic)
-    channel: int=field(init=False)
-    name: NoteName=field(init=False)
-    note_state: "NoteState"=field(init=False)
-    register: "Register"=field(init=False)
-    midi_message: MidiMessage=field(init=False)
+    # Allocated for every press and release, so kept small: the per-(note,
+    # action) constants come from a template cached on the note and only
+    # the delivery state is per event.
+    __slots__ = (
+        "note", "action", "queued", "sent", "ts", "lane", "enqueue_ts",
+        "channel", "name", "note_state", "register", "raw_message",
+    )
+    LANE: EventLane = EventLane.BULK
 
-    def __post_init__(self) -> None:
-        self.register = self.note.register
-        self.channel = self.register.channel
-        self.name = self.note.name
-        self.note_state = self.note.state
-        self._create_midi_message()
-
-    def _create_midi_message(self) -> None:
-        if self.action not in (NoteAction.PRESS, NoteAction.RELEASE):
-            self.midi_message = None
-            return
-        if self.name == NoteName.NONE:
-            self.midi_message = None
-            return
+    def __init__(
+            self,
+            note: "Note",
+            action: NoteAction,
+            queued: bool=False,
+            sent: bool=False,
+            ts: float|None=None,
+            lane: EventLane|None=None,
+            enqueue_ts: float|None=None
+        ) -> None:
+        self.note: "Note" = note
+        self.action: NoteAction = action
+        self.queued: bool = queued
+        self.sent: bool = sent
+        self.ts: float = monotonic() if ts is None else ts
+        self.lane: EventLane = self.LANE if lane is None else lane
+        self.enqueue_ts: float|None = enqueue_ts
+        # Keyed by delta, which is unique per action and hashes much faster
+        # than the enum member itself.
+        template: tuple = note.event_templates.get(action.delta) or self._create_template(note, action)
+        self.register, self.channel, self.name, self.note_state, self.raw_message = template
+
+    @classmethod
+    def _create_template(cls, note: "Note", action: NoteAction) -> tuple:
+        template: tuple = (note.register, *cls._template_fields(note, action))
+        note.event_templates[action.delta] = template
+        return template
+
+    @classmethod
+    def _template_fields(cls, note: "Note", action: NoteAction) -> tuple:
+        channel: int = note.register.channel
+        return channel, note.name, note.state, cls._raw_message(note.name, action, channel)
+
+    @staticmethod
+    def _raw_message(name: NoteName, action: NoteAction, channel: int) -> bytes|None:
+        if name == NoteName.NONE:
+            return None
+        # NYI: Make sure this channel makes sense.
+        # ChatGPT Claims there is some channel issues in mido
+        return raw_note_message(action, channel - CHANNEL_OFFSET, name.value)
 
-        self.midi_message = MidiMessage(
-                type = self.action.midi_message,
-                note = self.name.value,
-                velocity = 127,
-                # NYI: Make sure this channel makes sense.
-                channel = self.channel - CHANNEL_OFFSET # ChatGPT Claims there is some channel issues in mido
-        )
+    @property
+    def midi_message(self) -> MidiMessage|None:
+        # Only built on demand; the sender writes raw_message directly.
+        if self.raw_message is None:
+            return None
+        return MidiMessage.from_bytes(self.raw_message)
 
     def midi_complete(self) -> None:
-        logger.debug(f"MIDI completed for {self}")
         self.note_state.process_completed_event(self)
 
     def cancelled(self) -> None:
@@ -67,14 +97,54 @@ class NoteEvent:
 
 
 class NoteState:
+    # A view onto one slot of the organ's NoteStateStore; the counts live
+    # in the store's arrays rather than on this object.
+    PLANE: int = NOTES
+
     def __init__(self, note: "Note", max_count: int=MAX_ACTIVATIONS) -> None:
         self._note: "Note" = note
         self._name: NoteName = note.name
         self._register: "Register" = note.register
         self._max_count: int = max_count
-        self._actual_count: int = 0
-        self._queued_count: int = 0
-        self._last_action_ts: int = int(time.time() * 1000)
+        self._bind(note.register)
+
+    def _bind(self, register: "Register") -> None:
+        store: NoteStateStore = register.store
+        self._queued: np.ndarray = store.queued_flat
+        self._actual: np.ndarray = store.actual_flat
+        self._ts: np.ndarray = store.last_ts_flat
+        self._i: int = store.index(self.PLANE, register.index, self._name.value)
+        self._channel: int = int(store.channels[self.PLANE, register.index])
+
+    def _trace(self, kind: TraceKind, delta: int, event: object=None) -> None:
+        TRACER.record(
+            kind, id(event) if event is not None else 0, self._i, self._channel,
+            self._name.value, delta, self._queued_count, self._actual_count
+        )
+
+    @property
+    def _queued_count(self) -> int:
+        return int(self._queued[self._i])
+
+    @_queued_count.setter
+    def _queued_count(self, value: int) -> None:
+        self._queued[self._i] = value
+
+    @property
+    def _actual_count(self) -> int:
+        return int(self._actual[self._i])
+
+    @_actual_count.setter
+    def _actual_count(self, value: int) -> None:
+        self._actual[self._i] = value
+
+    @property
+    def _last_action_ts(self) -> float:
+        return float(self._ts[self._i])
+
+    @property
+    def count(self) -> int:
+        return self._queued_count
 
     @property
     def active(self) -> bool:
@@ -85,51 +155,68 @@ class NoteState:
         return self._queued_count > 0 
 
     def process_action(self, action: NoteAction) -> NoteAction:
-        logger.debug(f"Processing {action} for {self._name} on {self._register.name}, q_count={self._queued_count}, a_count={self._actual_count}")
+        if TRACER.enabled:
+            self._trace(TraceKind.PROCESS, action.delta)
         was_active: bool = self.queue_active
         self._queued_count = clamp_int(self._queued_count + action.delta, 0, self._max_count)
+        self._ts[self._i] = monotonic()
         if was_active != self.queue_active:
-            logger.debug(f"-> Yielding {action}")
+            if TRACER.enabled:
+                self._trace(TraceKind.YIELD, action.delta)
             return action
-        #logger.debug(f"-> Yielding {NoteAction.NONE}")
         return NoteAction.NONE
 
+    def force_count(self, count: int) -> NoteAction:
+        # Jump straight to a queued count, returning the action needed on
+        # the wire (if any) to match it.
+        was_active: bool = self.queue_active
+        self._queued_count = clamp_int(count, 0, self._max_count)
+        self._ts[self._i] = monotonic()
+        if was_active == self.queue_active:
+            return NoteAction.NONE
+        return NoteAction.PRESS if self.queue_active else NoteAction.RELEASE
+
     def process_completed_event(self, event: NoteEvent) -> None:
-        logger.debug(f"Actual count updated for {self}:  {self._actual_count} -> {self._actual_count + event.action.delta}")
         self._actual_count = self._actual_count + event.action.delta
+        if TRACER.enabled:
+            self._trace(TraceKind.COMPLETE, event.action.delta, event)
 
     def process_cancelled_event(self, event: NoteEvent) -> None:
-        logger.debug(f"Queued count updated for {self}:  {self._queued_count} -> {self._queued_count - event.action.delta}")
         self._queued_count = clamp_int(self._queued_count - event.action.delta, 0, self._max_count)
+        if TRACER.enabled:
+            self._trace(TraceKind.CANCEL, -event.action.delta, event)
 
     def __repr__(self) -> str:
         return f"<NoteState {self._name.pretty:3} on '{self._register.name}': q_count = {self._queued_count}/{self._max_count}, count = {self._actual_count}/{self._max_count}>"
 
 
 class StopState(NoteState):
+    PLANE: int = STOPS
+
     def __init__(self, stop: "Stop") -> None:
+        # Not bound to the store until the stop is given its register.
         self._stop: "Stop" = stop
         self._name = stop.name
         self._register: "Register" = None
         self._max_count: int = 1
-        self._actual_count: int = 0
-        self._queued_count: int = 0
-        self._last_action_ts: int = int(time.time() * 1000)
 
     def assign_register(self, register: "Register") -> None:
         self._register = register
+        self._bind(register)
 
     def __repr__(self) -> str:
         return f"<StopState {self._name} on '{self._register.name}': last_action_ts = {self._last_action_ts}, active={self.active}"
 
 HALLGRIMSKIRKJA_STOP_CHANNEL: int = 14
 
-@dataclass
 class HallgrimskirkjaStopEvent(NoteEvent):
-    def __post_init__(self) -> None:
-        super().__post_init__()
-        self.channel = HALLGRIMSKIRKJA_STOP_CHANNEL
-        self._create_midi_message()
+    __slots__ = ()
+    LANE: EventLane = EventLane.STOP
+
+    @classmethod
+    def _template_fields(cls, stop: "Stop", action: NoteAction) -> tuple:
+        channel: int = HALLGRIMSKIRKJA_STOP_CHANNEL
+        return channel, stop.name, stop.state, cls._raw_message(stop.name, action, channel)
 
     def __repr__(self) -> str:
         return f"<HallgrimskirkjaStopEvent: {self.action} for midi_note {self.name.value} on '{self.register.name}' over channel {self.channel}>"
@@ -148,6 +235,7 @@ class Stop:
     partial: bool = False
     state: StopState = field(init=False)
     register: "Register" = None
+    event_templates: dict[int, tuple] = field(init=False, default_factory=dict, repr=False, compare=False)
 
     def __post_init__(self) -> None:
         self.note_name = NoteName[f"N{self.number}"]
@@ -159,8 +247,11 @@ class Stop:
         self.register = register
         self.state.assign_register(register)
 
-    def get_stop_event(self, action: NoteAction) -> StopEvent:
-        return StopEvent(self, self.state.process_action(action))
+    def get_stop_event(self, action: NoteAction, ts: float|None=None) -> StopEvent:
+        return StopEvent(self, self.state.process_action(action), ts=ts)
+
+    def force_event(self, count: int, ts: float|None=None) -> StopEvent:
+        return StopEvent(self, self.state.force_count(count), ts=ts)
 
     def __repr__(self) -> str:
         return f"<Stop {self.stop_name} (note #{self.name.value}) on {self.register.name if self.register.name is not None else '<pending>'}: {('ON' if self.state.active else 'OFF'):3}>"
@@ -172,6 +263,11 @@ class Note:
         self._register: "Register" = register
         self._channel: int = register.channel
         self._state: NoteState = NoteState(self)
+        self._event_templates: dict[int, tuple] = {}
+
+    @property
+    def event_templates(self) -> dict[int, tuple]:
+        return self._event_templates
 
     @property
     def name(self) -> NoteName:
@@ -189,8 +285,11 @@ class Note:
     def state(self) -> NoteState:
         return self._state
 
-    def get_note_event(self, action: NoteAction) -> NoteEvent:
-        return NoteEvent(self, self._state.process_action(action))
+    def get_note_event(self, action: NoteAction, ts: float|None=None) -> NoteEvent:
+        return NoteEvent(self, self._state.process_action(action), ts=ts)
+
+    def force_event(self, count: int, ts: float|None=None) -> NoteEvent:
+        return NoteEvent(self, self._state.force_count(count), ts=ts)
 
     def __repr__(self) -> str:
         return f"<Note {self._name.pretty:3} on '{self._register.name}'>"
@@ -208,13 +307,24 @@ class Register:
         channel: int,
         stops: dict[str, Stop],
         low_note_name: NoteName=NoteName.N36,
-        high_note_name: NoteName=NoteName.N93
+        high_note_name: NoteName=NoteName.N93,
+        store: NoteStateStore|None=None,
+        index: int=0,
+        voice_budget: int=VOICE_BUDGET
     ) -> None:
         self._name: str = name
+        self._voice_budget: int = voice_budget
         self._channel: int = channel
-        self._notes: dict[NoteName, Note] = {nn: Note(nn, self) for nn in note_name_range(low_note_name, high_note_name)}
+        self._store: NoteStateStore = store if store is not None else NoteStateStore(1)
+        self._index: int = index
+        self._store.set_channel(NOTES, index, channel)
+        self._store.set_channel(STOPS, index, HALLGRIMSKIRKJA_STOP_CHANNEL)
+        self._note_table: NoteTable = NoteTable(low_note_name, high_note_name)
+        self._notes: dict[NoteName, Note] = {nn: Note(nn, self) for nn in self._note_table.names}
+        self._note_list: tuple[Note, ...] = tuple(self._notes.values())
         self._stops: dict[str, Stop] = stops
-        for stop in self._stops.values():
+        self._stop_list: tuple[Stop, ...] = tuple(self._stops.values())
+        for stop in self._stop_list:
             stop.assign_register(self)
 
     @property
@@ -226,35 +336,54 @@ class Register:
         return self._channel
 
     @property
-    def notes(self) -> list[Note]:
-        return list(self._notes.values())
+    def store(self) -> NoteStateStore:
+        return self._store
+
+    @property
+    def index(self) -> int:
+        return self._index
+
+    @property
+    def voice_budget(self) -> int:
+        return self._voice_budget
+
+    @property
+    def note_table(self) -> NoteTable:
+        return self._note_table
+
+    @property
+    def notes(self) -> tuple[Note, ...]:
+        return self._note_list
     
     @property
-    def stops(self) -> list[Stop]:
-        return list(self._stops.values())
+    def stops(self) -> tuple[Stop, ...]:
+        return self._stop_list
 
     @property
-    def note_names(self) -> list[NoteName]:
-        return list(self._notes.keys())
+    def note_names(self) -> tuple[NoteName, ...]:
+        return self._note_table.names
 
     @property
     def lowest_note(self) -> Note:
-        return self._notes[self.lowest_note_name]
+        return self._note_list[0]
 
     @property
     def lowest_note_name(self) -> NoteName:
-        return min(self._notes)
+        return self._note_table.lowest
 
     @property
     def highest_note(self) -> Note:
-        return self._notes[self.highest_note_name]
+        return self._note_list[-1]
 
     @property
     def highest_note_name(self) -> NoteName:
-        return max(self._notes)
+        return self._note_table.highest
+
+    def sounding_note_names(self) -> list[NoteName]:
+        return [get_note_name(n) for n in np.flatnonzero(self._store.actual[NOTES, self._index]).tolist()]
 
     def __iter__(self) -> Iterator[Note]:
-        return iter(self._notes.values())
+        return iter(self._note_list)
 
     def __getitem__(self, note_name: NoteName) -> Note|None:
         return self._notes.get(note_name, None)
@@ -265,11 +394,29 @@ class Register:
     def __len__(self) -> int:
         return len(self._notes)
 
+@dataclass(frozen=True)
+class TransitionStep:
+    target: Note|Stop
+    count: int
+    action: NoteAction
+
+    def event(self, ts: float|None=None) -> NoteEvent:
+        return self.target.force_event(self.count, ts)
+
+
 class Organ:
     def __init__(self, config: dict[str, any]):
         self._config: dict[str,any] = config
         self._name: str = config.get("defaults", {}).get("name", "Generic")
+        self._store: NoteStateStore = NoteStateStore(len(config.get("registers", [])))
         self._registers: dict[str, Register] = self.load_registers()
+        self._state_objects: dict[tuple[int, int, int], Note|Stop] = self._index_state_objects()
+
+    @classmethod
+    def from_file(cls, config_path: Path) -> "Organ":
+        # Goes through the compiled cache; the YAML is only parsed when
+        # the cache is stale.
+        return cls(load_organ_config(config_path))
 
     @property
     def name(self) -> str:
@@ -279,11 +426,20 @@ class Organ:
     def registers(self) -> list[Register]:
         return list(self._registers.values())
 
+    @property
+    def store(self) -> NoteStateStore:
+        return self._store
+
+    @property
+    def config(self) -> dict[str, any]:
+        return self._config
+
     def load_registers(self) -> dict[str, Register]:
         defaults: dict = self._config.get("defaults", {})
         d_low: int = defaults["note_range"]["low"]
         d_high: int = defaults["note_range"]["high"]
         d_max: int = defaults["max_activations"]
+        d_budget: int = defaults.get("voice_budget", VOICE_BUDGET)
 
         registers: dict[str, Register] = {}
 
@@ -301,11 +457,80 @@ class Organ:
                     midi_channel,
                     stops,
                     low_note_name=get_note_name(low_note_num),
-                    high_note_name=get_note_name(high_note_num)
+                    high_note_name=get_note_name(high_note_num),
+                    store=self._store,
+                    index=len(registers),
+                    voice_budget=reg_cfg.get("voice_budget", d_budget)
                  )
             registers[name] = _register
         return registers
 
+    def _index_state_objects(self) -> dict[tuple[int, int, int], Note|Stop]:
+        objects: dict[tuple[int, int, int], Note|Stop] = {}
+        for r in self:
+            for n in r:
+                objects[(NOTES, r.index, n.name.value)] = n
+            for s in r.stops:
+                objects[(STOPS, r.index, s.name.value)] = s
+        return objects
+
+    def snapshot(self) -> StateSnapshot:
+        return self._store.snapshot()
+
+    def transition(
+            self,
+            target: StateSnapshot,
+            source: StateSnapshot|None=None,
+            planes: tuple[int, ...]=(STOPS,)
+        ) -> list[TransitionStep]:
+        # The minimal set of events taking the queued state from source
+        # (default: now) to target: only keys whose on/off state differs.
+        # Releases come first so the transition never thickens the sound.
+        # Stops only by default, as the registration engine reads those
+        # back from the store. Keys pressed on the NOTES plane belong to no
+        # voice: they stay down until a later transition on that plane
+        # (or a panic) releases them.
+        source_queued: np.ndarray = self._store.queued if source is None else source.queued
+        changed: np.ndarray = (source_queued > 0) != (target.queued > 0)
+        skipped: list[int] = [p for p in range(len(changed)) if p not in planes]
+        changed[skipped] = False
+        steps: list[TransitionStep] = []
+        for plane, reg, note in zip(*(idx.tolist() for idx in np.nonzero(changed))):
+            count: int = int(target.queued[plane, reg, note])
+            action: NoteAction = NoteAction.PRESS if count > 0 else NoteAction.RELEASE
+            steps.append(TransitionStep(self._state_objects[(plane, reg, note)], count, action))
+        steps.sort(key=lambda step: step.action == NoteAction.PRESS)
+        return steps
+
+    def schedule_transition(
+            self,
+            target: StateSnapshot,
+            queue: "Queue",
+            scheduler: "EventScheduler",
+            duration: float=0.0,
+            source: StateSnapshot|None=None,
+            planes: tuple[int, ...]=(STOPS,)
+        ) -> list[TransitionStep]:
+        steps: list[TransitionStep] = self.transition(target, source, planes)
+        if not steps:
+            return steps
+        start: float = monotonic()
+        gap: float = duration / len(steps)
+        for k, step in enumerate(steps):
+            scheduler.call_at(start + k * gap, self._queue_transition_step, step, queue)
+        logger.info(f"Scheduled {len(steps)} transition events over {duration}s on {self}")
+        return steps
+
+    def _queue_transition_step(self, step: TransitionStep, queue: "Queue") -> None:
+        event: NoteEvent = step.event()
+        if event.action == NoteAction.NONE:
+            event.midi_complete()
+            return
+        try:
+            queue.put(event, block=False)
+        except Full:
+            event.cancelled()
+
     def load_stops(self, stop_config: dict[str, any]) -> dict[str, Stop]:
         stops: dict[str, any] = {}
         for note_name_code, stop_info in stop_config.items():
@@ -313,6 +538,11 @@ class Organ:
             stops[stop_info["stop_name"]] = s
         return stops
 
+    def sounding_keys(self) -> list[tuple[int, int]]:
+        # (channel, midi note) for every note and stop whose last sent
+        # state is on.
+        return self._store.active_keys(NOTES) + self._store.active_keys(STOPS)
+
     def __iter__(self) -> Iterator[Register]:
         return iter(self._registers.values())
 
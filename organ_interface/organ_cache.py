@@ -0,0 +1,166 @@
+# Compiled organ configs.
+#
+#   python -m organ_interface.organ_cache config/organ/*.yml
+#   python -m organ_interface.organ_cache --check config/organ/*.yml
+#
+# The organ YAML is validated once and stored, with every default resolved,
+# as a small binary file next to it. The file is keyed by a hash of the
+# YAML bytes, so editing the YAML simply makes the cache stale and it is
+# rebuilt on the next load.
+from loguru import logger
+from pathlib import Path
+import hashlib
+import marshal
+import struct
+import sys
+
+from .helpers import load_config
+
+CACHE_MAGIC: bytes = b"ORGC"
+# Bump when the compiled layout changes.
+CACHE_VERSION: int = 2
+# magic, cache version, marshal version, sha256 of the YAML
+CACHE_HEADER: struct.Struct = struct.Struct("<4sHH32s")
+# Per-register voice budget when the YAML gives none.
+VOICE_BUDGET: int = 15
+
+
+class OrganConfigError(ValueError):
+    pass
+
+
+def cache_path(config_path: Path) -> Path:
+    return config_path.with_name(f".{config_path.stem}.orgc")
+
+
+def config_hash(data: bytes) -> bytes:
+    return hashlib.sha256(data).digest()
+
+
+def _check(condition: bool, message: str) -> None:
+    if not condition:
+        raise OrganConfigError(message)
+
+
+def compile_config(config: dict[str, any]) -> dict[str, any]:
+    # The checks Organ.load_registers asserts, plus the ones it cannot
+    # (stop numbers, presets), with the defaults filled in per register.
+    defaults: dict = config.get("defaults", {})
+    _check("note_range" in defaults and "max_activations" in defaults, "defaults need note_range and max_activations")
+    d_low: int = defaults["note_range"]["low"]
+    d_high: int = defaults["note_range"]["high"]
+    d_max: int = defaults["max_activations"]
+    d_budget: int = defaults.get("voice_budget", VOICE_BUDGET)
+    _check(
+        defaults.get("voice_steal_policy", "oldest") in ("oldest", "quietest", "lowest_priority"),
+        f"Unknown voice_steal_policy {defaults.get('voice_steal_policy')}."
+    )
+    _check(
+        defaults.get("voice_allocation", "least_loaded") in ("least_loaded", "random"),
+        f"Unknown voice_allocation {defaults.get('voice_allocation')}."
+    )
+    _check(defaults.get("voice_rate_weight", 1.0) >= 0, "voice_rate_weight must not be negative.")
+
+    registers: list[dict[str, any]] = []
+    stop_numbers: set[int] = set()
+    for reg_cfg in config.get("registers", []):
+        name: str = reg_cfg["name"]
+        channel: int = reg_cfg["midi"]["channel"]
+        _check(channel in range(1, 17), f"Midi Channel, {channel} is out of bounds [1,16] on {name}.")
+        low: int = reg_cfg.get("note_range", {}).get("low", d_low)
+        high: int = reg_cfg.get("note_range", {}).get("high", d_high)
+        _check(0 <= low < high <= 127, f"Note range {low}-{high} is invalid on {name}.")
+        budget: int = reg_cfg.get("voice_budget", d_budget)
+        _check(budget >= 0, f"Voice budget {budget} is invalid on {name}.")
+        stops: dict[str, dict[str, any]] = {}
+        for code, stop_info in reg_cfg.get("stops", {}).items():
+            _check(code.startswith("N") and code[1:].isdigit() and int(code[1:]) <= 127, f"Bad stop key {code} on {name}.")
+            _check("stop_name" in stop_info, f"Stop {code} on {name} has no stop_name.")
+            _check(int(code[1:]) not in stop_numbers, f"Stop {code} on {name} is defined twice.")
+            stop_numbers.add(int(code[1:]))
+            stops[code] = dict(stop_info)
+        registers.append({
+            "name": name,
+            "midi": {"channel": channel},
+            "max_activations": reg_cfg.get("max_activations", d_max),
+            "voice_budget": budget,
+            "note_range": {"low": low, "high": high},
+            "stops": stops,
+        })
+    _check(len({r["name"] for r in registers}) == len(registers), "Register names must be unique.")
+
+    registrations: dict[str, list[int]] = {}
+    for preset, numbers in config.get("registrations", {}).items():
+        unknown: list[int] = [n for n in numbers if n not in stop_numbers]
+        _check(not unknown, f"Registration '{preset}' refers to unknown stops {unknown}.")
+        registrations[preset] = list(numbers)
+
+    return {**config, "registers": registers, "registrations": registrations}
+
+
+def read_cache(path: Path, digest: bytes) -> dict[str, any]|None:
+    try:
+        data: bytes = path.read_bytes()
+        magic, version, marshal_version, cached_digest = CACHE_HEADER.unpack_from(data)
+    except (OSError, struct.error):
+        return None
+    if (magic, version, marshal_version, cached_digest) != (CACHE_MAGIC, CACHE_VERSION, marshal.version, digest):
+        return None
+    try:
+        return marshal.loads(data[CACHE_HEADER.size:])
+    except (EOFError, ValueError, TypeError):
+        return None
+
+
+def write_cache(path: Path, digest: bytes, compiled: dict[str, any]) -> None:
+    data: bytes = CACHE_HEADER.pack(CACHE_MAGIC, CACHE_VERSION, marshal.version, digest) + marshal.dumps(compiled)
+    tmp: Path = path.with_suffix(".tmp")
+    tmp.write_bytes(data)
+    tmp.replace(path)
+
+
+def build_cache(config_path: Path) -> dict[str, any]:
+    digest: bytes = config_hash(config_path.read_bytes())
+    compiled: dict[str, any] = compile_config(load_config(config_path))
+    try:
+        write_cache(cache_path(config_path), digest, compiled)
+    except OSError as e:
+        logger.warning(f"Could not write organ cache for {config_path}: {e}")
+    return compiled
+
+
+def load_organ_config(config_path: Path) -> dict[str, any]:
+    # Only falls back to parsing the YAML when the cache is missing, stale
+    # or from another version.
+    digest: bytes = config_hash(config_path.read_bytes())
+    compiled: dict[str, any]|None = read_cache(cache_path(config_path), digest)
+    if compiled is not None:
+        return compiled
+    logger.info(f"Compiling organ config {config_path}")
+    return build_cache(config_path)
+
+
+def main(args: list[str]) -> int:
+    check_only: bool = "--check" in args
+    paths: list[Path] = [Path(a) for a in args if a != "--check"]
+    if not paths:
+        print("usage: python -m organ_interface.organ_cache [--check] CONFIG.yml ...")
+        return 2
+    failed: int = 0
+    for path in paths:
+        try:
+            if check_only:
+                compile_config(load_config(path))
+                fresh: bool = read_cache(cache_path(path), config_hash(path.read_bytes())) is not None
+                print(f"{path}: ok{'' if fresh else ' (cache stale)'}")
+            else:
+                build_cache(path)
+                print(f"{path}: compiled to {cache_path(path)}")
+        except (OrganConfigError, KeyError, TypeError, OSError) as e:
+            print(f"{path}: {type(e).__name__}: {e}")
+            failed += 1
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
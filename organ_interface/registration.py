@@ -0,0 +1,208 @@
+from loguru import logger
+from collections import deque
+from queue import Queue, Full
+from time import monotonic, sleep
+from typing import Callable, Iterator
+
+import numpy as np
+
+from .organ import Organ, Stop, StopEvent
+from .note_attributes import NoteAction
+from .note_store import STOPS
+from .scheduler import EventScheduler
+
+# How soon stop changes held back by a full STOP lane are tried again.
+STOP_RETRY_S: float = 0.01
+
+
+class Registration:
+    # A set of pulled stops as one bitmask per register (bit n = stop on
+    # MIDI note n), so comparing two registrations is a XOR per register.
+    def __init__(self, name: str, masks: tuple[int, ...]) -> None:
+        self._name: str = name
+        self._masks: tuple[int, ...] = masks
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def masks(self) -> tuple[int, ...]:
+        return self._masks
+
+    def __or__(self, other: "Registration") -> "Registration":
+        return Registration(f"{self._name}+{other.name}", tuple(a | b for a, b in zip(self._masks, other.masks)))
+
+    def __sub__(self, other: "Registration") -> "Registration":
+        return Registration(f"{self._name}-{other.name}", tuple(a & ~b for a, b in zip(self._masks, other.masks)))
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, Registration) and self._masks == other.masks
+
+    def __hash__(self) -> int:
+        return hash(self._masks)
+
+    def __len__(self) -> int:
+        return sum(m.bit_count() for m in self._masks)
+
+    def __repr__(self) -> str:
+        return f"<Registration '{self._name}': {len(self)} stops>"
+
+
+def iter_bits(mask: int) -> Iterator[int]:
+    while mask:
+        low: int = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class RegistrationEngine:
+    # Named stop presets compiled once from the organ config's
+    # `registrations` section, plus timed stop changes that run on a
+    # scheduler thread. Changes are laid end to end on one timeline so they
+    # keep their order without blocking the caller. When the scheduler
+    # dispatches to the note-state owner, pass its idle() as sleep so
+    # wait() keeps running the stop changes it is waiting for.
+    def __init__(
+            self,
+            organ: Organ,
+            queue: Queue,
+            scheduler: EventScheduler|None=None,
+            sleep: Callable[[float], None]=sleep
+        ) -> None:
+        self._organ: Organ = organ
+        self._queue: Queue = queue
+        self._scheduler: EventScheduler = scheduler if scheduler is not None else EventScheduler("registration")
+        self._sleep: Callable[[float], None] = sleep
+        self._n_registers: int = organ.store.n_registers
+        self._slots: dict[int, tuple[int, int]] = {}
+        self._by_slot: dict[tuple[int, int], Stop] = {}
+        for r in organ:
+            for s in r.stops:
+                self._slots[s.name.value] = (r.index, 1 << s.name.value)
+                self._by_slot[(r.index, s.name.value)] = s
+        self._presets: dict[str, Registration] = {
+            name: self.compile(numbers, name)
+            for name, numbers in organ.config.get("registrations", {}).items()
+        }
+        self._cursor: float = 0.0
+        # Where the stops will be once everything scheduled has been sent.
+        self._planned: Registration|None = None
+        # Due stop changes the STOP lane had no room for, oldest first.
+        # Later ones queue behind them so a stop's changes keep their order.
+        self._backlog: deque[tuple[Stop, NoteAction]] = deque()
+        logger.info(f"Compiled {len(self._presets)} registrations for {organ}")
+
+    @property
+    def presets(self) -> dict[str, Registration]:
+        return self._presets
+
+    def __getitem__(self, name: str) -> Registration:
+        return self._presets[name]
+
+    def compile(self, numbers: list[int], name: str="custom") -> Registration:
+        masks: list[int] = [0 for _ in range(self._n_registers)]
+        for n in numbers:
+            try:
+                index, bit = self._slots[n]
+            except KeyError:
+                logger.warning(f"Registration '{name}' refers to unknown stop #{n}")
+                continue
+            masks[index] |= bit
+        return Registration(name, tuple(masks))
+
+    def from_stops(self, stops: list[Stop], name: str="custom") -> Registration:
+        return self.compile([s.name.value for s in stops], name)
+
+    def current(self) -> Registration:
+        # What the stops are queued to, i.e. including changes not yet sent.
+        rows: np.ndarray = np.packbits(self._organ.store.queued_mask(STOPS), axis=1, bitorder="little")
+        return Registration("current", tuple(int.from_bytes(row.tobytes(), "little") for row in rows))
+
+    def stops(self, registration: Registration) -> list[Stop]:
+        return [self._by_slot[(index, n)] for index, mask in enumerate(registration.masks) for n in iter_bits(mask)]
+
+    def planned(self) -> Registration:
+        if self._planned is not None and self._cursor > monotonic():
+            return self._planned
+        return self.current()
+
+    def diff(self, target: Registration, source: Registration|None=None) -> tuple[list[Stop], list[Stop]]:
+        # (stops to release, stops to pull) to get from source to target.
+        source = source if source is not None else self.planned()
+        releases: list[Stop] = []
+        presses: list[Stop] = []
+        for index, (old, new) in enumerate(zip(source.masks, target.masks)):
+            changed: int = old ^ new
+            if not changed:
+                continue
+            releases.extend(self._by_slot[(index, n)] for n in iter_bits(changed & old))
+            presses.extend(self._by_slot[(index, n)] for n in iter_bits(changed & new))
+        return releases, presses
+
+    def _queue_stop_event(self, stop: Stop, action: NoteAction) -> None:
+        # Runs on the note-state owner, so it never waits for the queue: a
+        # full STOP lane leaves the change in the backlog for a retry.
+        self._backlog.append((stop, action))
+        if len(self._backlog) == 1:
+            self._flush_backlog()
+
+    def _flush_backlog(self) -> None:
+        while self._backlog:
+            stop, action = self._backlog[0]
+            se: StopEvent = stop.get_stop_event(action)
+            if se.action != NoteAction.NONE:
+                try:
+                    self._queue.put(se, block=False)
+                except Full:
+                    # Undo the queued count; the change is made again on retry.
+                    se.note_state.process_cancelled_event(se)
+                    logger.warning(f"STOP lane full, {len(self._backlog)} stop changes held back")
+                    self._scheduler.call_later(STOP_RETRY_S, self._flush_backlog)
+                    return
+            else:
+                se.midi_complete()
+            self._backlog.popleft()
+
+    def schedule(self, stops: list[Stop], action: NoteAction, duration: float, sleep_first: bool=True) -> float:
+        # Spreads the stop changes over duration, starting after anything
+        # already scheduled. Returns when the last one is due.
+        if not stops:
+            return self._cursor
+        changed: Registration = self.from_stops(stops)
+        self._planned = self.planned() | changed if action == NoteAction.PRESS else self.planned() - changed
+        start: float = max(monotonic(), self._cursor)
+        delay: float = duration / len(stops)
+        offset: float = delay if sleep_first else 0.0
+        for k, s in enumerate(stops):
+            self._scheduler.call_at(start + offset + k * delay, self._queue_stop_event, s, action)
+        self._cursor = start + duration
+        return self._cursor
+
+    def crossfade(self, target: Registration, duration: float, press_first: bool=False, source: Registration|None=None) -> float:
+        # Only the stops that differ are touched; half the time is spent on
+        # each direction.
+        releases, presses = self.diff(target, source)
+        if press_first:
+            self.schedule(presses, NoteAction.PRESS, duration / 2, sleep_first=False)
+            return self.schedule(releases, NoteAction.RELEASE, duration / 2)
+        self.schedule(releases, NoteAction.RELEASE, duration / 2, sleep_first=False)
+        return self.schedule(presses, NoteAction.PRESS, duration / 2)
+
+    def pause(self, seconds: float) -> None:
+        # A gap on the timeline before the next scheduled change.
+        self._cursor = max(monotonic(), self._cursor) + seconds
+
+    def wait(self) -> None:
+        remaining: float = self._cursor - monotonic()
+        if remaining > 0:
+            self._sleep(remaining)
+
+    def cancel(self) -> None:
+        self._scheduler.cancel_all()
+        self._backlog.clear()
+        self._cursor = 0.0
+        self._planned = None
+
+    def stop(self) -> None:
+        self._scheduler.stop()
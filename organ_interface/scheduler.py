@@ -0,0 +1,89 @@
+from loguru import logger
+from threading import Thread, Condition
+from time import monotonic
+from typing import Callable
+import heapq
+
+from .helpers import sleep_until
+
+
+class EventScheduler:
+    # Runs callbacks at absolute monotonic() times on one background thread,
+    # so timed work (stop crossfades, state transitions) does not block
+    # whoever set it up. With dispatch (e.g. VoiceManager.submit), due
+    # callbacks are handed to it instead of run here, so they run on the
+    # thread that owns the note state.
+    def __init__(
+            self,
+            name: str="scheduler",
+            spin_s: float=0.001,
+            dispatch: Callable[..., any]|None=None
+        ) -> None:
+        self._name: str = name
+        self._spin_s: float = spin_s
+        self._dispatch: Callable[..., any]|None = dispatch
+        self._heap: list[tuple[float, int, Callable, tuple]] = []
+        self._seq: int = 0
+        self._cond: Condition = Condition()
+        self._running: bool = False
+        self._thread: Thread|None = None
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def call_at(self, due: float, fn: Callable, *args: any) -> None:
+        with self._cond:
+            heapq.heappush(self._heap, (due, self._seq, fn, args))
+            self._seq += 1
+            self._cond.notify()
+        if not self._running:
+            self.start()
+
+    def call_later(self, delay: float, fn: Callable, *args: any) -> None:
+        self.call_at(monotonic() + delay, fn, *args)
+
+    def cancel_all(self) -> int:
+        with self._cond:
+            n: int = len(self._heap)
+            self._heap.clear()
+            self._cond.notify()
+        return n
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while self._running:
+                    if not self._heap:
+                        self._cond.wait()
+                        continue
+                    timeout: float = self._heap[0][0] - monotonic() - self._spin_s
+                    if timeout <= 0:
+                        break
+                    self._cond.wait(timeout)
+                if not self._running:
+                    return
+                due, _, fn, args = heapq.heappop(self._heap)
+            sleep_until(due, self._spin_s)
+            try:
+                if self._dispatch is not None:
+                    self._dispatch(fn, *args)
+                else:
+                    fn(*args)
+            except Exception as e:
+                logger.error(f"Scheduled call {fn} failed in '{self._name}': {e}")
+
+    def start(self) -> None:
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = Thread(target=self._run, name=self._name, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+        self._thread = None
@@ -0,0 +1,172 @@
+# Hot-path tracing for notes and MIDI events.
+#
+# Instead of formatting log lines per event, the organ, voices and MIDI
+# senders write fixed-size records into a preallocated ring. Call sites
+# check TRACER.enabled first, so with tracing off the cost is one
+# attribute lookup. The ring can be dumped to a file during or after a
+# performance and decoded with
+#
+#   python -m organ_interface.tracing trace.bin [--last N]
+from loguru import logger
+from enum import IntEnum
+from itertools import count
+from pathlib import Path
+from time import monotonic
+import atexit
+import struct
+import sys
+
+from .note_attributes import midi_note_name
+
+#   ts, event id, store slot, kind, channel, note, action delta,
+#   queued count, actual count
+TRACE_RECORD: struct.Struct = struct.Struct("<dQIBBBbhh4x")
+TRACE_MAGIC: bytes = b"ORGT"
+TRACE_VERSION: int = 1
+TRACE_HEADER: struct.Struct = struct.Struct("<4sHHQ")
+
+
+class TraceKind(IntEnum):
+    PROCESS = 0     # NoteState.process_action, before the count changes
+    YIELD = 1       # process_action produced a wire event
+    COMPLETE = 2    # event sent (or dropped as a no-op), actual count updated
+    CANCEL = 3      # event never sent, queued count rolled back
+    DEQUEUE = 4     # sender took the event off its queue
+    DROP = 5        # sender had nothing to send for it
+    SEND = 6        # bytes written to the port
+
+
+class Tracer:
+    def __init__(self, capacity: int=0) -> None:
+        self.enabled: bool = False
+        self._capacity: int = 0
+        self._mask: int = 0
+        self._buf: bytearray = bytearray()
+        self._seq = count()
+        self._written: int = 0
+        if capacity:
+            self.enable(capacity)
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    def enable(self, capacity: int=65536) -> None:
+        assert capacity > 0 and capacity & (capacity - 1) == 0, f"Trace capacity {capacity} must be a power of two."
+        if capacity != self._capacity:
+            self._buf = bytearray(capacity * TRACE_RECORD.size)
+            self._capacity = capacity
+            self._mask = capacity - 1
+        self.clear()
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def clear(self) -> None:
+        self._seq = count()
+        self._written = 0
+
+    def record(
+            self,
+            kind: TraceKind,
+            event_id: int=0,
+            slot: int=0,
+            channel: int=0,
+            note: int=0,
+            delta: int=0,
+            queued: int=0,
+            actual: int=0
+        ) -> None:
+        # next() on itertools.count is atomic under the GIL, so threads
+        # never write the same slot.
+        seq: int = next(self._seq)
+        TRACE_RECORD.pack_into(
+            self._buf, (seq & self._mask) * TRACE_RECORD.size,
+            monotonic(), event_id & 0xFFFFFFFFFFFFFFFF, slot, kind, channel, note & 0xFF, delta, queued, actual
+        )
+        # Only read by records(); a racing writer can leave it one short.
+        self._written = seq + 1
+
+    def __len__(self) -> int:
+        return min(self._written, self._capacity)
+
+    def records(self) -> list[tuple]:
+        # Oldest first.
+        n: int = self._written
+        start: int = max(0, n - self._capacity)
+        return [
+            TRACE_RECORD.unpack_from(self._buf, (seq & self._mask) * TRACE_RECORD.size)
+            for seq in range(start, n)
+        ]
+
+    def dump(self, path: Path) -> int:
+        records: list[tuple] = self.records()
+        with Path(path).open("wb") as f:
+            f.write(TRACE_HEADER.pack(TRACE_MAGIC, TRACE_VERSION, TRACE_RECORD.size, len(records)))
+            for r in records:
+                f.write(TRACE_RECORD.pack(*r))
+        return len(records)
+
+
+TRACER: Tracer = Tracer()
+
+
+def trace_event(kind: TraceKind, event: "NoteEvent") -> None:
+    # Works from the wire bytes so it also covers the sender process's
+    # RingEvents, which carry no note objects.
+    raw: bytes|None = event.raw_message
+    if raw is None:
+        TRACER.record(kind, id(event), 0, event.channel)
+        return
+    delta: int = 1 if raw[0] & 0xF0 == 0x90 and raw[2] > 0 else -1
+    TRACER.record(kind, id(event), 0, event.channel, raw[1], delta)
+
+
+def _dump_at_exit(path: Path) -> None:
+    n: int = TRACER.dump(path)
+    logger.info(f"Wrote {n} trace records to {path}")
+
+
+def configure(config: dict[str, any]) -> Tracer:
+    if not config.get("enabled", False):
+        TRACER.disable()
+        return TRACER
+    TRACER.enable(config.get("capacity", 65536))
+    if config.get("dump_path"):
+        atexit.register(_dump_at_exit, Path(config["dump_path"]))
+    return TRACER
+
+
+def load(path: Path) -> list[tuple]:
+    data: bytes = Path(path).read_bytes()
+    magic, version, size, n = TRACE_HEADER.unpack_from(data)
+    if magic != TRACE_MAGIC or version != TRACE_VERSION or size != TRACE_RECORD.size:
+        raise ValueError(f"{path} is not a version {TRACE_VERSION} organ trace.")
+    return [r for r in TRACE_RECORD.iter_unpack(data[TRACE_HEADER.size:TRACE_HEADER.size + n * size])]
+
+
+def format_record(record: tuple, t0: float=0.0) -> str:
+    ts, event_id, slot, kind, channel, note, delta, queued, actual = record
+    note_name: str = midi_note_name(note) if note < 128 else "--"
+    return (
+        f"{(ts - t0) * 1000:12.3f} ms {TraceKind(kind).name:8} ch {channel:2} {note_name:4} "
+        f"delta {delta:+d} q={queued} a={actual} slot={slot} event={event_id:#x}"
+    )
+
+
+def main(args: list[str]) -> int:
+    if not args:
+        print("usage: python -m organ_interface.tracing TRACE.bin [--last N]")
+        return 2
+    records: list[tuple] = load(Path(args[0]))
+    if "--last" in args:
+        records = records[-int(args[args.index("--last") + 1]):]
+    t0: float = records[0][0] if records else 0.0
+    for r in records:
+        print(format_record(r, t0))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,59 @@
+# Precomputed ratio trajectories for RatioVoice sweeps.
+#
+# An easing maps sweep progress t in [0, 1] to a ratio in [0, 1]. A
+# trajectory samples it at every tick of a sweep up front, so the tick
+# itself is an array lookup. Easings that take an rng (random_walk) give
+# every voice its own path; the others are shared by all voices.
+from typing import Callable
+
+import numpy as np
+
+# (progress, number of voices, rng) -> ratios, shape (ticks,) or (ticks, voices)
+Easing = Callable[[np.ndarray, int, np.random.Generator], np.ndarray]
+
+
+def linear(t: np.ndarray, n_voices: int, rng: np.random.Generator) -> np.ndarray:
+    return t
+
+
+def exponential(t: np.ndarray, n_voices: int, rng: np.random.Generator, rate: float=5.0) -> np.ndarray:
+    # Slow start, fast finish.
+    return np.expm1(rate * t) / np.expm1(rate)
+
+
+def s_curve(t: np.ndarray, n_voices: int, rng: np.random.Generator) -> np.ndarray:
+    # Smoothstep: slow at both ends.
+    return t * t * (3.0 - 2.0 * t)
+
+
+def random_walk(t: np.ndarray, n_voices: int, rng: np.random.Generator, spread: float=0.15) -> np.ndarray:
+    # A Brownian bridge around the linear ramp per voice, pinned to 0 and
+    # 1 at the ends so every voice still finishes the sweep.
+    steps: np.ndarray = rng.standard_normal((len(t), n_voices)) / np.sqrt(max(len(t), 1))
+    walk: np.ndarray = np.cumsum(steps, axis=0)
+    bridge: np.ndarray = walk - t[:, None] * walk[-1]
+    return t[:, None] + spread * bridge
+
+
+EASINGS: dict[str, Easing] = {
+    "linear": linear,
+    "exponential": exponential,
+    "s_curve": s_curve,
+    "random_walk": random_walk,
+}
+
+
+def sweep_progress(steps: int) -> np.ndarray:
+    # Progress after each of the steps + 1 ticks of cycle_notes: tick k
+    # has taken k + 1 steps of 1 / steps, the last one clipped to 1.
+    return np.minimum(np.arange(1, steps + 2, dtype=np.float64) / steps, 1.0)
+
+
+def trajectory(easing: str|Easing, steps: int, n_voices: int, seed: int|None=None) -> np.ndarray:
+    # Ratios for every tick and voice, shape (steps + 1, n_voices),
+    # clipped to [0, 1]. Rows are contiguous, one per tick.
+    fn: Easing = EASINGS[easing] if isinstance(easing, str) else easing
+    ratios: np.ndarray = fn(sweep_progress(steps), n_voices, np.random.default_rng(seed))
+    if ratios.ndim == 1:
+        ratios = np.repeat(ratios[:, None], n_voices, axis=1)
+    return np.clip(ratios, 0.0, 1.0)
@@ -0,0 +1,267 @@
+from enum import StrEnum
+from itertools import count
+from time import monotonic
+from typing import TYPE_CHECKING
+import heapq
+import math
+import random
+
+from .organ import Organ, Register
+
+if TYPE_CHECKING:
+    from .voices import Voice
+
+
+class StealPolicy(StrEnum):
+    OLDEST = "oldest"
+    # Off voices first, then ones whose note another voice also holds, so
+    # taking them changes nothing that is heard.
+    QUIETEST = "quietest"
+    LOWEST_PRIORITY = "lowest_priority"
+
+
+class Allocation(StrEnum):
+    LEAST_LOADED = "least_loaded"
+    RANDOM = "random"
+
+
+class Overflow(StrEnum):
+    # For voice classes that MAY_OVERFLOW, when every register is full and
+    # nothing may be stolen: a slot past the budget of the least-loaded
+    # register, or nothing at all.
+    OVER_BUDGET = "over_budget"
+    REFUSE = "refuse"
+
+
+# MIDI rates are resampled at most this often, as an exponential moving
+# average with time constant RATE_TAU_S.
+RATE_WINDOW_S: float = 0.25
+RATE_TAU_S: float = 2.0
+
+
+class VoiceAllocator:
+    # Hands out register slots within per-register voice budgets. Free
+    # slots are counters and the registers with room are kept as an
+    # ordered set, so checking for room, adding and removing a voice are
+    # O(1) plus an O(log registers) heap push. When all of them are full,
+    # a voice is chosen to steal from among those whose class PRIORITY is
+    # lower than the newcomer's, or equal if the class is
+    # STEALABLE_BY_PEERS; that is a scan over all voices, O(voices). If
+    # there is none, the overflow policy decides.
+    #
+    # With LEAST_LOADED, new voices go to the register at the top of a
+    # min-heap keyed by load: its share of its budget plus rate_weight
+    # times its channel's share of the MIDI queued by voices lately.
+    # Entries are invalidated by a per-register version rather than
+    # removed, and the heap is rebuilt when the rates are resampled.
+    def __init__(
+            self,
+            budgets: dict[Register, int],
+            policy: StealPolicy=StealPolicy.OLDEST,
+            allocation: Allocation=Allocation.LEAST_LOADED,
+            rate_weight: float=1.0,
+            overflow: Overflow=Overflow.OVER_BUDGET
+        ) -> None:
+        self._budgets: dict[Register, int] = dict(budgets)
+        self._free: dict[Register, int] = dict(budgets)
+        self._open: dict[Register, None] = {r: None for r, n in budgets.items() if n > 0}
+        # Voice name -> (allocation order, voice), oldest first.
+        self._voices: dict[str, tuple[int, "Voice"]] = {}
+        self._seq = count()
+        self._policy: StealPolicy = policy
+        self._allocation: Allocation = allocation
+        self._rate_weight: float = rate_weight
+        self._overflow: Overflow = overflow
+        # Events queued per register, and the smoothed rate behind them.
+        self._midi_counts: dict[Register, int] = {r: 0 for r in budgets}
+        self._sampled_counts: dict[Register, int] = {r: 0 for r in budgets}
+        self._rates: dict[Register, float] = {r: 0.0 for r in budgets}
+        self._rate_share: dict[Register, float] = {r: 0.0 for r in budgets}
+        self._sample_ts: float = monotonic()
+        # (load, register index, version, register)
+        self._heap: list[tuple[float, int, int, Register]] = []
+        self._versions: dict[Register, int] = {r: 0 for r in budgets}
+        self._order: dict[Register, int] = {r: k for k, r in enumerate(budgets)}
+        self._rebuild_heap()
+
+    @classmethod
+    def from_organ(cls, organ: Organ, policy: StealPolicy|str|None=None) -> "VoiceAllocator":
+        defaults: dict[str, any] = organ.config.get("defaults", {})
+        if policy is None:
+            policy = defaults.get("voice_steal_policy", StealPolicy.OLDEST)
+        return cls(
+            {r: r.voice_budget for r in organ},
+            StealPolicy(policy),
+            Allocation(defaults.get("voice_allocation", Allocation.LEAST_LOADED)),
+            defaults.get("voice_rate_weight", 1.0),
+            Overflow(defaults.get("voice_overflow", Overflow.OVER_BUDGET))
+        )
+
+    @property
+    def policy(self) -> StealPolicy:
+        return self._policy
+
+    @policy.setter
+    def policy(self, policy: StealPolicy|str) -> None:
+        self._policy = StealPolicy(policy)
+
+    @property
+    def allocation(self) -> Allocation:
+        return self._allocation
+
+    @allocation.setter
+    def allocation(self, allocation: Allocation|str) -> None:
+        self._allocation = Allocation(allocation)
+
+    @property
+    def overflow(self) -> Overflow:
+        return self._overflow
+
+    @overflow.setter
+    def overflow(self, overflow: Overflow|str) -> None:
+        self._overflow = Overflow(overflow)
+
+    @property
+    def rate_weight(self) -> float:
+        return self._rate_weight
+
+    @rate_weight.setter
+    def rate_weight(self, weight: float) -> None:
+        self._rate_weight = weight
+        self._rebuild_heap()
+
+    def budget(self, register: Register) -> int:
+        return self._budgets[register]
+
+    def free(self, register: Register) -> int:
+        return max(self._free[register], 0)
+
+    def is_full(self, register: Register) -> bool:
+        return self._free[register] <= 0
+
+    def open_registers(self) -> tuple[Register, ...]:
+        return tuple(self._open)
+
+    def midi_rate(self, register: Register) -> float:
+        # Smoothed events/s queued by voices on the register.
+        self._sample_rates(monotonic())
+        return self._rates[register]
+
+    def load(self, register: Register) -> float:
+        budget: int = self._budgets[register]
+        if budget <= 0:
+            return math.inf
+        return (budget - self._free[register]) / budget + self._rate_weight * self._rate_share[register]
+
+    def record_midi(self, register: Register, n: int) -> None:
+        self._midi_counts[register] += n
+
+    def _sample_rates(self, now: float) -> None:
+        dt: float = now - self._sample_ts
+        if dt < RATE_WINDOW_S:
+            return
+        alpha: float = 1.0 - math.exp(-dt / RATE_TAU_S)
+        for r, n in self._midi_counts.items():
+            self._rates[r] += alpha * ((n - self._sampled_counts[r]) / dt - self._rates[r])
+            self._sampled_counts[r] = n
+        total: float = sum(self._rates.values())
+        for r, rate in self._rates.items():
+            self._rate_share[r] = rate / total if total > 0 else 0.0
+        self._sample_ts = now
+        self._rebuild_heap()
+
+    def _push(self, register: Register) -> None:
+        if len(self._heap) > 4 * len(self._budgets):
+            self._rebuild_heap()
+            return
+        self._versions[register] += 1
+        heapq.heappush(self._heap, (self.load(register), self._order[register], self._versions[register], register))
+
+    def _rebuild_heap(self) -> None:
+        for r in self._versions:
+            self._versions[r] += 1
+        self._heap = [(self.load(r), self._order[r], self._versions[r], r) for r in self._budgets]
+        heapq.heapify(self._heap)
+
+    def _least_loaded(self) -> Register|None:
+        heap = self._heap
+        while heap:
+            load, _, version, register = heap[0]
+            if version != self._versions[register] or self._free[register] <= 0:
+                # Stale, or full; it is pushed again when a slot frees up.
+                heapq.heappop(heap)
+                continue
+            return register
+        return None
+
+    def choose_register(self) -> Register|None:
+        # A register with a free slot, None when all are full.
+        if not self._open:
+            return None
+        if self._allocation is Allocation.RANDOM:
+            return random.choice(tuple(self._open))
+        self._sample_rates(monotonic())
+        return self._least_loaded()
+
+    def overflow_register(self) -> Register|None:
+        # Where a voice goes past its budget: the register least loaded
+        # relative to its budget. Registers with no budget never take one.
+        if self._overflow is Overflow.REFUSE:
+            return None
+        candidates: list[Register] = [r for r, n in self._budgets.items() if n > 0]
+        if not candidates:
+            return None
+        self._sample_rates(monotonic())
+        return min(candidates, key=self.load)
+
+    def add(self, voice: "Voice") -> None:
+        # Voices placed on a full register explicitly are still counted;
+        # the register then stays closed until enough of them leave.
+        self.remove(voice)
+        self._voices[voice.name] = (next(self._seq), voice)
+        register: Register = voice.register
+        self._free[register] -= 1
+        if self._free[register] <= 0:
+            self._open.pop(register, None)
+        self._push(register)
+
+    def remove(self, voice: "Voice") -> None:
+        entry: tuple[int, "Voice"]|None = self._voices.get(voice.name)
+        if entry is None or entry[1] is not voice:
+            return
+        del self._voices[voice.name]
+        register: Register = voice.register
+        self._free[register] += 1
+        if self._free[register] > 0:
+            self._open[register] = None
+        self._push(register)
+
+    def victim(self, priority: int, register: Register|None=None) -> "Voice|None":
+        # The voice to give up its slot to a newcomer of the given priority,
+        # optionally only on one register. None if nothing may be taken.
+        candidates: list[tuple[int, "Voice"]] = [
+            (seq, v) for seq, v in self._voices.values()
+            if (v.PRIORITY < priority or v.PRIORITY == priority and v.STEALABLE_BY_PEERS)
+            and (register is None or v.register is register)
+        ]
+        if not candidates:
+            return None
+        if self._policy is StealPolicy.QUIETEST:
+            return min(candidates, key=lambda c: (c[1].is_on, self._sounds_alone(c[1]), c[0]))[1]
+        if self._policy is StealPolicy.LOWEST_PRIORITY:
+            return min(candidates, key=lambda c: (c[1].PRIORITY, c[0]))[1]
+        # Oldest first: the dict is in allocation order.
+        return candidates[0][1]
+
+    @staticmethod
+    def _sounds_alone(voice: "Voice") -> bool:
+        # Whether taking the voice silences its pipe, i.e. no other voice
+        # holds the same note.
+        return voice.register[voice.active_note].state.count <= 1
+
+    def __len__(self) -> int:
+        return len(self._voices)
+
+    def __repr__(self) -> str:
+        slots: str = ", ".join(f"{r.name} {self._budgets[r] - self.free(r)}/{self._budgets[r]}" for r in self._budgets)
+        return f"<VoiceAllocator ({self._allocation}, {self._policy}, {self._overflow}) {slots}>"
@@ -1,20 +1,36 @@
 from loguru import logger
-from typing import Iterator
+from typing import Callable, Iterator
 import random
 import time
 
 from .organ import Organ, Register, Note, NoteEvent
 from scenes.scenes import Scene
-from .note_attributes import NoteName, NoteAction, get_note_name, note_name_range, get_note_subset
+from .note_attributes import NoteName, NoteAction, EventLane, get_note_name, note_name_range, get_note_subset
 from .helpers import clamp_float
+from .control_clock import ControlClock, ClockStats, TickCallback
+from .trajectories import Easing, trajectory
+from .commands import CommandQueue
+from .voice_allocator import VoiceAllocator
+from concurrent.futures import Future
 from queue import Queue, Full
+from threading import Lock, RLock
 
 from abc import abstractmethod
 
-MAX_PEDAL_VOICES = 9 # was 6
-MAX_VOICES = 15 # was 12
+import numpy as np
+
+IDLE_COMMAND_PERIOD = 0.01
 
 class Voice:
+    LANE: EventLane = EventLane.BULK
+    # A new voice may steal the slot of one with a lower priority, or the
+    # same priority if STEALABLE_BY_PEERS.
+    PRIORITY: int = 0
+    STEALABLE_BY_PEERS: bool = True
+    # Whether it may go over budget when there is nothing left to steal
+    # (see Overflow).
+    MAY_OVERFLOW: bool = False
+
     def __init__(self, voice_id: str, register: Register) -> None:
 
         self._id: str = voice_id
@@ -22,6 +38,9 @@ class Voice:
 
         self._voice_on: bool = False
         self._changed: bool = False
+        # Whether this voice's press of the active note is still held.
+        self._sounding: bool = False
+        self._registry: "VoiceManager|None" = None
 
         self._notes: list[NoteName] = self.allowed_notes
         self._last_note: NoteName = self._notes[0]
@@ -37,7 +56,7 @@ class Voice:
 
     def create_note_list(self, first_note: NoteName, last_note: NoteName, reset: bool=True) -> None:
         # should implement chords/scales here.
-        self.notes = list(note_name_range(first_note, last_note))
+        self.notes = list(self._register.note_table.span(first_note, last_note))
         if reset:
             self.reset()
 
@@ -53,7 +72,7 @@ class Voice:
 
         current_note: NoteName = self.active_note
         endpoints: list[NoteName] = []
-        subset_notes: list[NoteName] = get_note_subset(self.allowed_notes, include_notes)
+        subset_notes: list[NoteName] = list(self._register.note_table.subset(include_notes))
         
         if keep_current:
             try:
@@ -86,7 +105,7 @@ class Voice:
     @next_note.setter
     def next_note(self, next_note: NoteName) -> None:
         if next_note != self._next_note:
-            self._changed = True
+            self._mark_changed()
         self._next_note = next_note
 
     @property
@@ -96,7 +115,7 @@ class Voice:
     @active_note.setter
     def active_note(self, next_note: NoteName) -> None:
         if next_note != self._active_note:
-            self._changed = True
+            self._mark_changed()
         self._last_note = self._active_note
         self._active_note = next_note
 
@@ -105,26 +124,55 @@ class Voice:
         return self._register
 
     @property
-    def allowed_notes(self) -> list[NoteName]:
+    def allowed_notes(self) -> tuple[NoteName, ...]:
         return self._register.note_names
 
+    @property
+    def is_on(self) -> bool:
+        return self._voice_on
+
+    @property
+    def changed(self) -> bool:
+        return self._changed
+
+    def attach(self, registry: "VoiceManager|None") -> None:
+        self._registry = registry
+
+    def _mark_changed(self) -> None:
+        # Only the clean -> changed flip is reported, so a voice is in its
+        # registry's dirty set at most once.
+        if self._changed:
+            return
+        self._changed = True
+        if self._registry is not None:
+            self._registry.mark_dirty(self)
+
     def on(self) -> None:
         was: bool = self._voice_on
         self._voice_on = True
         if was != self._voice_on:
-            self._changed = True
+            self._mark_changed()
+            if self._registry is not None:
+                self._registry.voice_state_changed(self)
 
     def off(self) -> None:
         was: bool = self._voice_on
         self._voice_on = False
         if was != self._voice_on:
-            self._changed = True
+            self._mark_changed()
+            if self._registry is not None:
+                self._registry.voice_state_changed(self)
 
-    def create_note_events(self) -> list[NoteEvent|None]:
+    def create_note_events(self, ts: float|None=None) -> list[NoteEvent|None]:
         if not self._changed:
             return [None]
         if not self._voice_on:
-            return [self._create_active_note_event(NoteAction.RELEASE)]
+            # Release once; an off voice stays clean until it changes again.
+            self._changed = False
+            if not self._sounding:
+                return [None]
+            self._sounding = False
+            return [self._create_active_note_event(NoteAction.RELEASE, ts)]
 
         note_events: list[NoteEvent] = []
         # BUG: This migt not work correctly between voices on startup.
@@ -132,33 +180,39 @@ class Voice:
         # I think it should be ok on the underlying method thoguh.
         # Maybe add a self._startup flag?
 
-        note_events.append(self._create_active_note_event(NoteAction.RELEASE))
+        note_events.append(self._create_active_note_event(NoteAction.RELEASE, ts))
         self.active_note = self.next_note
-        note_events.append(self._create_active_note_event(NoteAction.PRESS))
+        note_events.append(self._create_active_note_event(NoteAction.PRESS, ts))
+        self._sounding = True
         self._changed = False
         
         return note_events
 
-    def queue_midi(self, queue: Queue) -> None:
-        note_events: list[NoteEvent] = self.create_note_events()
+    def queue_midi(self, queue: Queue, ts: float|None=None) -> None:
+        note_events: list[NoteEvent] = self.create_note_events(ts)
         if note_events is None:
             return
+        n_queued: int = 0
         for note_event in note_events:
             if note_event is None:
                 continue
             if note_event.action == NoteAction.NONE:
                 note_event.midi_complete()
                 continue
+            note_event.lane = self.LANE
             try:
                 queue.put(note_event, block=False)
+                n_queued += 1
             except Full:
                 note_event.cancelled()
+        if n_queued and self._registry is not None:
+            self._registry.record_midi(self._register, n_queued)
 
     def _get_active_note(self) -> Note:
         return self._register[self.active_note]
 
-    def _create_active_note_event(self, action: NoteAction) -> NoteEvent:
-        return self._get_active_note().get_note_event(action)
+    def _create_active_note_event(self, action: NoteAction, ts: float|None=None) -> NoteEvent:
+        return self._get_active_note().get_note_event(action, ts)
 
     def __getitem__(self, num: int) -> NoteName:
         return self._notes[num]
@@ -175,6 +229,13 @@ class Voice:
         )
 
 class WebVoice(Voice):
+    LANE: EventLane = EventLane.INTERACTIVE
+    PRIORITY: int = 2
+    # Each belongs to a connected client, who would be left holding a
+    # dead voice. A new client still gets one, over budget if need be.
+    STEALABLE_BY_PEERS: bool = False
+    MAY_OVERFLOW: bool = True
+
     def reset(self) -> None:
         self.next_note = self._notes[0]
         self.active_note = self.next_note
@@ -191,7 +252,16 @@ class WebVoice(Voice):
             return
         self.next_note = self._notes[num]
 
+    def set_slider(self, num: int, touching: bool) -> None:
+        self.set_note_num(num)
+        if touching:
+            self.on()
+        else:
+            self.off()
+
 class RatioVoice(Voice):
+    PRIORITY: int = 1
+
     def __init__(self, voice_id: str, register: Register) -> None:
         self._ratio: float = 0.0
         self._ratio_multiplier:int
@@ -219,6 +289,98 @@ class RatioVoice(Voice):
         index = min(index, self._ratio_multiplier)
         self.next_note = self._notes[index]
 
+    def _apply_sweep(self, ratio: float, index: int) -> None:
+        # Same result as the ratio setter, with the index already worked
+        # out by a RatioSweepEngine.
+        self._ratio = ratio
+        self.next_note = self._notes[index]
+
+
+class RatioSweepEngine:
+    # Ratios, note tables and current notes of a set of RatioVoices held in
+    # arrays so a sweep step is a few vectorised ops. Only voices whose
+    # note actually changed are touched afterwards. The voices' note lists
+    # must not change while the engine is in use.
+    def __init__(self, voices: list[RatioVoice]) -> None:
+        self._voices: list[RatioVoice] = voices
+        lengths: np.ndarray = np.array([len(v.notes) for v in voices], dtype=np.int64)
+        self._offsets: np.ndarray = np.zeros(len(voices), dtype=np.int64)
+        np.cumsum(lengths[:-1], out=self._offsets[1:])
+        self._multipliers: np.ndarray = np.maximum(lengths - 1, 1)
+        self._table: np.ndarray = np.fromiter(
+            (n.value for v in voices for n in v.notes), dtype=np.int16, count=int(lengths.sum())
+        )
+        self._ratios: np.ndarray = np.array([v.ratio for v in voices], dtype=np.float64)
+        self._indices: np.ndarray = self._to_indices()
+        self._notes: np.ndarray = np.array([v.next_note.value for v in voices], dtype=np.int16)
+        self._changed: np.ndarray = np.zeros(len(voices), dtype=bool)
+        # Per-tick rows set by load_trajectory, shape (ticks, voices).
+        self._trajectory_ratios: np.ndarray|None = None
+        self._trajectory_indices: np.ndarray|None = None
+        self._trajectory_notes: np.ndarray|None = None
+
+    def __len__(self) -> int:
+        return len(self._voices)
+
+    @property
+    def ratios(self) -> np.ndarray:
+        return self._ratios
+
+    def _to_indices(self) -> np.ndarray:
+        # np.rint rounds half to even, like round().
+        return np.minimum(np.rint(self._ratios * self._multipliers).astype(np.int64), self._multipliers)
+
+    def step(self, delta: float) -> np.ndarray:
+        # Advances every ratio by delta; returns the positions of the
+        # voices whose next note changed.
+        np.add(self._ratios, delta, out=self._ratios)
+        np.clip(self._ratios, 0.0, 1.0, out=self._ratios)
+        self._indices = self._to_indices()
+        notes: np.ndarray = self._table[self._offsets + self._indices]
+        np.not_equal(notes, self._notes, out=self._changed)
+        self._notes = notes
+        return np.flatnonzero(self._changed)
+
+    def load_trajectory(self, ratios: np.ndarray) -> None:
+        # Precomputes the note index and note of every voice at every tick
+        # of a sweep, so seek() is a row lookup and a compare.
+        ratios = np.ascontiguousarray(ratios, dtype=np.float64)
+        assert ratios.ndim == 2 and ratios.shape[1] == len(self), \
+            f"Trajectory shape {ratios.shape} does not match {len(self)} voices."
+        indices: np.ndarray = np.minimum(np.rint(ratios * self._multipliers).astype(np.int64), self._multipliers)
+        self._trajectory_ratios = ratios
+        self._trajectory_indices = indices
+        self._trajectory_notes = self._table[self._offsets + indices]
+
+    @property
+    def trajectory_length(self) -> int:
+        return 0 if self._trajectory_ratios is None else len(self._trajectory_ratios)
+
+    def seek(self, tick: int) -> np.ndarray:
+        # Moves every voice to its trajectory row for tick; returns the
+        # positions of the voices whose next note changed. Ticks can be
+        # skipped.
+        notes: np.ndarray = self._trajectory_notes[tick]
+        np.not_equal(notes, self._notes, out=self._changed)
+        # Copied, since step() updates the ratios in place.
+        np.copyto(self._ratios, self._trajectory_ratios[tick])
+        self._indices = self._trajectory_indices[tick]
+        self._notes = notes
+        return np.flatnonzero(self._changed)
+
+    def queue_midi(self, changed: np.ndarray, queue: Queue, ts: float|None=None) -> None:
+        ratios: list[float] = self._ratios[changed].tolist()
+        indices: list[int] = self._indices[changed].tolist()
+        for k, ratio, index in zip(changed.tolist(), ratios, indices):
+            v: RatioVoice = self._voices[k]
+            v._apply_sweep(ratio, index)
+            v.queue_midi(queue, ts)
+
+    def sync(self) -> None:
+        # Writes the ratios and next notes back to every voice.
+        for v, ratio, index in zip(self._voices, self._ratios.tolist(), self._indices.tolist()):
+            v._apply_sweep(ratio, index)
+
 class ComputerVoice(Voice):
     pass
 
@@ -239,13 +401,15 @@ class VoiceController:
         for v in self:
             v.assign_random_range(include_notes, keep_current, reset)
 
-    def queue_all_midi(self) -> None:
-        for v in self:
-            try:
-                v.queue_midi(self.queue)
-            except AttributeError as e:
-                logger.error(e)
-                logger.error(v)
+    def queue_all_midi(self, ts: float|None=None) -> None:
+        # Only voices that changed since the last flush are visited.
+        with self._vm.flush_lock:
+            for v in self._vm.take_dirty(self._voice_cls):
+                try:
+                    v.queue_midi(self.queue, ts)
+                except AttributeError as e:
+                    logger.error(e)
+                    logger.error(v)
 
     def all_on(self):
         for v in self:
@@ -260,8 +424,16 @@ class VoiceController:
         # Also maybe this should be done down to voice level.
         pass
 
+    def _run_on_clock(self, tick: TickCallback, ticks: int, period: float) -> ClockStats:
+        clock: ControlClock = self._vm.clock
+        clock.subscribe(tick)
+        try:
+            return clock.run(ticks, period)
+        finally:
+            clock.unsubscribe(tick)
+
     def __len__(self) -> int:
-        return len(list(self._vm.get_voices_by_class(self._voice_cls)))
+        return self._vm.count_voices_by_class(self._voice_cls)
 
     def __iter__(self) -> Iterator[Voice]:
         return iter(self._vm.get_voices_by_class(self._voice_cls))
@@ -277,27 +449,37 @@ class RatioVoiceController(VoiceController):
                 v.queue_midi(self.queue)
 
     def increment_all_voice_ratios(self, delta: float) -> None:
+        # One-off steps stay per voice; building a RatioSweepEngine only
+        # pays off over a whole sweep (see cycle_notes).
         for v in self:
             v.ratio += delta
 
-    def cycle_notes(self, loop_time: float=0.01, steps: int=1000, timing:bool=False):
+    def cycle_notes(
+            self,
+            loop_time: float=0.01,
+            steps: int=1000,
+            timing:bool=False,
+            easing: str|Easing="linear",
+            seed: int|None=None
+        ):
+        # The whole sweep is computed up front from the easing (see
+        # trajectories.py), so a tick is a row lookup plus the changed
+        # voices' events.
         self.set_all_voice_ratios(0.0)
+        engine: RatioSweepEngine = RatioSweepEngine(list(self))
+        engine.load_trajectory(trajectory(easing, steps, len(engine), seed))
+
+        # Events are stamped with their tick's deadline so a scheduled
+        # MidiOutput can send them on time regardless of producer jitter.
+        # Ticks the clock skipped are simply never looked up, so the sweep
+        # still ends at 1.0 on time.
+        def tick(k: int, deadline: float) -> None:
+            engine.queue_midi(engine.seek(k), self.queue, ts=deadline)
+
+        stats: ClockStats = self._run_on_clock(tick, steps + 1, loop_time)
+        engine.sync()
         if timing:
-            times = []
-        for k in range(steps + 1):
-            loop_start = time.perf_counter()
-            self.increment_all_voice_ratios(1.0 / steps)
-            self.queue_all_midi()
-            
-            if timing:
-                times.append(time.perf_counter() - loop_start)
-            time.sleep(loop_time - (loop_start - time.perf_counter()))
-
-        if timing:
-            import numpy as np
-            print("max:", max(times)*1000, "ms")
-            print("avg:", np.mean(times)*1000, "ms")
-            print("99th percentile:", np.percentile(times, 99)*1000, "ms")
+            print(stats.summary())
 
 class WebVoiceController(VoiceController):
     def set_all_voice_nums(self, num: int) -> None:
@@ -307,10 +489,11 @@ class WebVoiceController(VoiceController):
 
             
     def cycle_notes(self) -> None:
-        for k in range(40):
+        def tick(k: int, deadline: float) -> None:
             self.set_all_voice_nums(k)
-            self.queue_all_midi()
-            time.sleep(0.1)
+            self.queue_all_midi(ts=deadline)
+
+        self._run_on_clock(tick, 40, 0.1)
 
 
 class ComputerVoiceController(VoiceController):
@@ -322,8 +505,28 @@ class VoiceManager:
         self._organ = organ
         self._queue: Queue = queue
         self._registers = organ.registers
+        # Indexes kept up to date by create_voice/remove_voice and the
+        # voices' on()/off(). Readers get tuple snapshots, so another
+        # thread adding a voice never breaks an iteration.
         self._voices: dict[str, Voice] = {}
-        self._voice_count: dict[Register, int] = {reg: 0 for reg in organ}
+        self._by_class: dict[type[Voice], dict[str, Voice]] = {}
+        self._by_register: dict[Register, dict[str, Voice]] = {reg: {} for reg in organ}
+        self._active: dict[str, Voice] = {}
+        # Slots per register, budgets from the organ YAML.
+        self._allocator: VoiceAllocator = VoiceAllocator.from_organ(organ)
+        # Voices with unsent changes. Taken under the lock so the song
+        # thread and the web handler never flush the same voice twice.
+        self._dirty: dict[str, Voice] = {}
+        self._dirty_lock: Lock = Lock()
+        # Held while dirty voices are turned into events, since voices on
+        # different threads can share notes.
+        self._flush_lock: RLock = RLock()
+        self._clock: ControlClock = ControlClock(name="voice-clock")
+        # Other threads (the web handler) change voices through submit();
+        # the owner runs their commands first thing on every clock tick
+        # and while it idles.
+        self._commands: CommandQueue = CommandQueue("voice-commands")
+        self._clock.subscribe(self._run_commands)
         self._voice_controllers: dict[type[Voice], VoiceController] = {}
         for voice_cls in Voice.__subclasses__():
             controller_cls_name = voice_cls.__name__ + "Controller"
@@ -338,18 +541,29 @@ class VoiceManager:
     def voice_controllers(self) -> Iterator[VoiceController]:
         return self._voice_controllers.values()
 
+    @property
+    def allocator(self) -> VoiceAllocator:
+        return self._allocator
+
     def register_full(self, register: Register) -> bool:
-        max_per_voice: int = MAX_VOICES
-        if register.name == "Pedal":
-            max_per_voice = MAX_PEDAL_VOICES
-        return self._voice_count[register] >= max_per_voice
+        return self._allocator.is_full(register)
 
     def create_random_voice(self, voice_id: str|None=None, voice_cls: type[Voice]=Voice) -> Voice|None:
-        registers: list[Register] = [r for r in self._organ if not self.register_full(r)]
-        if len(registers) <= 0:
-            logger.error("All voices are ocupied.")
-            return
-        register: Register = random.choice(registers)
+        # A free slot if there is one, otherwise one taken from a voice of
+        # the same or lower priority, otherwise an over-budget one if the
+        # class MAY_OVERFLOW. None only if all of those fail.
+        register: Register|None = self._allocator.choose_register()
+        if register is None:
+            victim: Voice|None = self._allocator.victim(voice_cls.PRIORITY)
+            if victim is not None:
+                logger.info(f"Stealing {victim} ({self._allocator.policy}) for a new {voice_cls.__name__}")
+                register = victim.register
+                self.steal_voice(victim)
+            elif voice_cls.MAY_OVERFLOW and (register := self._allocator.overflow_register()) is not None:
+                logger.warning(f"All voices are occupied, {register.name} goes over budget for a new {voice_cls.__name__}")
+            else:
+                logger.error("All voices are ocupied.")
+                return
         if voice_id is None:
             voice_id = ''.join(random.choices('0123456789abcdef', k=10))
         return self.create_voice(voice_id, register, voice_cls)
@@ -360,19 +574,123 @@ class VoiceManager:
 
     def create_voice(self, voice_id: str, register: Register, voice_cls: type[Voice]=Voice) -> Voice:
         voice: Voice = voice_cls(voice_id, register)
+        previous: Voice|None = self._voices.get(voice_id)
+        if previous is not None:
+            # Releases its note, not just its slot.
+            self.steal_voice(previous)
         self._voices[voice_id] = voice
-        self._voice_count[voice._register] += 1
+        for cls in type(voice).__mro__:
+            if issubclass(cls, Voice):
+                self._by_class.setdefault(cls, {})[voice_id] = voice
+        self._by_register[voice.register][voice_id] = voice
+        voice.attach(self)
+        self._allocator.add(voice)
+        self.voice_state_changed(voice)
+        if voice.changed:
+            self.mark_dirty(voice)
         return voice
 
     def remove_voice(self, voice: Voice) -> None:
+        if self._voices.get(voice.name) is not voice:
+            logger.warning(f"{voice} is not registered with {self}")
+            return
         self._voices.pop(voice.name)
-        self._voice_count[voice.register] -= 1 # need to have a check here.
+        for cls in type(voice).__mro__:
+            if issubclass(cls, Voice):
+                self._by_class[cls].pop(voice.name, None)
+        self._by_register[voice.register].pop(voice.name, None)
+        self._active.pop(voice.name, None)
+        with self._dirty_lock:
+            self._dirty.pop(voice.name, None)
+        self._allocator.remove(voice)
+        voice.attach(None)
+
+    def record_midi(self, register: Register, n: int) -> None:
+        self._allocator.record_midi(register, n)
+
+    def steal_voice(self, voice: Voice) -> None:
+        # Silences the voice and frees its slot.
+        voice.off()
+        with self._flush_lock:
+            voice.queue_midi(self._queue)
+        self.remove_voice(voice)
+
+    def voice_state_changed(self, voice: Voice) -> None:
+        if voice.is_on:
+            self._active[voice.name] = voice
+        else:
+            self._active.pop(voice.name, None)
+
+    @property
+    def clock(self) -> ControlClock:
+        return self._clock
+
+    @property
+    def flush_lock(self) -> RLock:
+        return self._flush_lock
+
+    @property
+    def commands(self) -> CommandQueue:
+        return self._commands
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        # The changes a command makes are flushed right after it runs,
+        # whether that is now (no owner, or called by the owner) or on
+        # the owner's next drain.
+        future: Future = self._commands.submit(fn, *args, **kwargs)
+        if future.done():
+            self.queue_all_midi()
+        return future
+
+    def _run_commands(self, tick: int, deadline: float) -> None:
+        if self._commands.drain():
+            self.queue_all_midi(ts=deadline)
+
+    def idle(self, seconds: float, period: float=IDLE_COMMAND_PERIOD) -> None:
+        # time.sleep() for the owner thread that keeps running submitted
+        # commands every period.
+        if not self._commands.is_owner:
+            time.sleep(seconds)
+            return
+        deadline: float = time.monotonic() + seconds
+        while True:
+            if self._commands.drain():
+                self.queue_all_midi()
+            remaining: float = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            time.sleep(min(period, remaining))
+
+    def mark_dirty(self, voice: Voice) -> None:
+        with self._dirty_lock:
+            self._dirty[voice.name] = voice
+
+    def take_dirty(self, voice_cls: type[Voice]=Voice) -> list[Voice]:
+        # Removes and returns the changed voices of voice_cls, skipping any
+        # that were already sent by some other path (e.g. a sweep engine).
+        with self._dirty_lock:
+            taken: list[Voice] = [v for v in self._dirty.values() if isinstance(v, voice_cls)]
+            for v in taken:
+                del self._dirty[v.name]
+        return [v for v in taken if v.changed]
 
     def get_voice_controller(self, voice_cls: type[Voice]) -> VoiceController:
         return self._voice_controllers[voice_cls]
 
-    def get_voices_by_class(self, voice_cls: type[Voice]) -> Iterator[type[Voice]]:
-        return filter(lambda v: isinstance(v, voice_cls), self)
+    def get_voices_by_class(self, voice_cls: type[Voice]) -> tuple[Voice, ...]:
+        return tuple(self._by_class.get(voice_cls, {}).values())
+
+    def count_voices_by_class(self, voice_cls: type[Voice]) -> int:
+        return len(self._by_class.get(voice_cls, {}))
+
+    def get_voices_by_register(self, register: Register) -> tuple[Voice, ...]:
+        return tuple(self._by_register[register].values())
+
+    def count_voices_by_register(self, register: Register) -> int:
+        return len(self._by_register[register])
+
+    def active_voices(self) -> tuple[Voice, ...]:
+        return tuple(self._active.values())
 
     def load_scene(self, scene: Scene, allow_same: bool=False) -> None:
         for v in self:
@@ -389,21 +707,27 @@ class VoiceManager:
                 v.create_note_list(scene.get_note(v.register, exclude=v[-1]), v[-1], reset=True)
 
     def __getattr__(self, name):
+        # Resolved once per name: the dispatcher is stored on the instance,
+        # so later lookups never come back here.
+        if name.startswith("_"):
+            raise AttributeError(name)
+        methods = [getattr(vc, name) for vc in self._voice_controllers.values() if hasattr(vc, name)]
+        if not methods:
+            raise AttributeError(f"No controller has method {name}")
         def dispatcher(*args, **kwargs):
-            handled = False
-            for vc in self.voice_controllers:
-                if hasattr(vc, name):
-                    getattr(vc, name)(*args, **kwargs)
-                    handled = True
-            if not handled:
-                raise AttributeError(f"No controller has method {name}")
+            for method in methods:
+                method(*args, **kwargs)
+        self.__dict__[name] = dispatcher
         return dispatcher
 
     def __getitem__(self, voice_id: str) -> Voice:
         return self._voices[voice_id]
 
+    def __contains__(self, voice_id: str) -> bool:
+        return voice_id in self._voices
+
     def __iter__(self) -> Iterator[Voice]:
-        return iter(self._voices.values())
+        return iter(tuple(self._voices.values()))
 
     def __len__(self) -> int:
         return len(self._voices)
@@ -14,7 +14,7 @@ def get_all_notes(
     all_register_notes = {}
 
     for r in organ: 
-        all_register_notes[r] = [n for n in all_in_key if n <= r.highest_note.name]
+        all_register_notes[r] = [n for n in all_in_key if n <= r.highest_note_name]
 
     return all_register_notes
 
@@ -1,11 +1,11 @@
 from queue import Queue, Full
 from loguru import logger
 
-import time
-
 from organ_interface.organ import Organ, Register, Note, Stop, NoteEvent, StopEvent
-from organ_interface.note_attributes import NoteName, NoteAction, get_note_subset
+from organ_interface.note_attributes import NoteName, NoteAction
 from organ_interface.voices import RatioVoice, VoiceManager, Voice
+from organ_interface.scheduler import EventScheduler
+from organ_interface.registration import RegistrationEngine, Registration
 
 from .scenes import Scene, get_all_notes, RepeatsAllowedScene, FavourLowScene, FavourHighScene
 
@@ -19,19 +19,15 @@ class SongManager:
         self._queue: Queue = vm.queue
         self._registers: list[Register] = list(organ)
         self._stops: dict[NoteName, Stop] = {s.name: s for r in self._registers for s in r.stops if s.duplicates is False and s.effect is False}
+        # Stop changes are timed here but run by the owner of the note
+        # state (the song thread while it plays).
+        self._scheduler: EventScheduler = EventScheduler("song-scheduler", dispatch=vm.submit)
+        self._registration: RegistrationEngine = RegistrationEngine(organ, self._queue, self._scheduler, sleep=vm.idle)
 
     def _send_stop_events(self, time_taken:int, stops: list[Stop], action: NoteAction=NoteAction.PRESS, sleep_first: bool=True) -> None:
-        if len(stops) <= 0:
-            return
-        se: StopEvent
-        delay: float = time_taken / len(stops)
-        for s in stops:
-            if sleep_first:
-                time.sleep(delay)
-            se = s.get_stop_event(action)
-            if not sleep_first:
-                time.sleep(delay)
-            self._queue_event(se)
+        # Runs on the scheduler; stop changes queue up behind each other
+        # but no longer hold up the song thread.
+        self._registration.schedule(list(stops), action, time_taken, sleep_first)
 
     def _send_stop_events_by_int(self, time_taken: int, nums: list[int], action: NoteAction=NoteAction.PRESS, sleep_first:bool=True) -> None:
         stops: list[Stop] = self._get_stops_by_int(nums)
@@ -41,7 +37,10 @@ class SongManager:
         return [s for n, s in self._stops.items() if n in note_names]
 
     def _get_stops_by_int(self, nums: list[int]) -> list[Stop]:
-        return self._get_stops([NoteName[f"N{n}"] for n in nums])
+        return self._registration.stops(self._registration.compile(nums))
+
+    def _preset_ints(self, name: str) -> list[int]:
+        return [s.name.value for s in self._registration.stops(self._registration[name])]
 
     def _get_notes_by_int(self, nums: list[int]) -> list[NoteName]:
         return [NoteName(n) for n in nums]
@@ -65,16 +64,17 @@ class SongManager:
         self._send_stop_events(4, all_stops, NoteAction.PRESS)
         self._send_stop_events(2, all_stops, NoteAction.RELEASE)
         self._send_stop_events(1, all_stops, NoteAction.PRESS)
-        time.sleep(0.5)
+        self._registration.pause(0.5)
         self._send_stop_events(0, all_stops, NoteAction.RELEASE)
-        time.sleep(0.5)
+        self._registration.wait()
+        self._vm.idle(0.5)
 
     def get_adjusted_notes(self, notes: list[Note]) -> dict[Register, list[NoteName]]:
         r_pedal = self._organ["Pedal"]
         n = {r: notes for r in self._registers if r != r_pedal}
         n[r_pedal] = []
         for note in notes:
-            if note >= r_pedal.lowest_note_name and note <= r_pedal.highest_note_name:
+            if note in r_pedal.note_table:
                 n[self._organ["Pedal"]].append(note)
                 continue
             n_temp = note
@@ -92,10 +92,23 @@ class SongManager:
         v.queue_midi(self._queue)
         return v
 
+    def _next_quietest_voice(self, pending: dict[Register, list[Voice]]) -> Voice:
+        register: Register = min((r for r, vs in pending.items() if vs), key=self._vm.allocator.midi_rate)
+        return pending[register].pop()
+
     def reset_ranges(self) -> None:
         self._vm.assign_random_ranges(["C", "E", "G"], keep_current = True)
 
     def play_song(self) -> None:
+        # The song thread owns the voices while it plays; the web handler's
+        # changes are run by it on each clock tick and while it idles.
+        self._vm.commands.claim()
+        try:
+            self._play_song()
+        finally:
+            self._vm.commands.release()
+
+    def _play_song(self) -> None:
 
         TESTING: bool = False
         NO_INTRO: bool = False
@@ -127,17 +140,9 @@ class SongManager:
         #    67, 73, 79
         #]
         
-        stop_set_soft = [0, 13, 32, 52, 77]
-        stop_set_2 = [2, 12, 35, 55, 79]
-        stop_set_3 = [72, 61, 44, 24]
-
-        finale_stops = [
-            0, 1,
-            10, 11, 16, 24, 25, 
-            31, 33, 36, 38,
-            51, 54, 56, 62,
-            67, 68, 69, 77, 79
-        ]
+        stop_set_soft = self._preset_ints("soft")
+        stop_set_2 = self._preset_ints("set_2")
+        stop_set_3 = self._preset_ints("set_3")
 
         # Create Random Stops for after the soft stops
         random_stops_1 = []
@@ -199,7 +204,7 @@ class SongManager:
             self._send_stop_events_by_int(5, stop_set_soft, NoteAction.PRESS, sleep_first=False)
 
         if not TESTING:
-            time.sleep(1)
+            self._vm.idle(1)
 
         if not ONLY_PLAY_FINALE:
             logger.info("Starting cycle")
@@ -230,12 +235,12 @@ class SongManager:
                 self.reset_ranges()
                 vm.load_scene(scene)
                 logger.info(f"end of loop {k}")
-                time.sleep(1)
+                self._vm.idle(1)
 
             logger.info("Slow loop with possible full range")
             vc.cycle_notes(loop_time=0.02)
 
-            time.sleep(1)
+            self._vm.idle(1)
             self.reset_ranges()
 
             # Random stops:
@@ -244,18 +249,18 @@ class SongManager:
             for stops in random_stops_1:
                 self._send_stop_events_by_int(4, stops, NoteAction.PRESS, sleep_first=False)
                 vc.cycle_notes(loop_time=0.01)
-                #time.sleep(1)
+                #self._vm.idle(1)
                 self.reset_ranges()
                 self._send_stop_events_by_int(1, stops, NoteAction.RELEASE)
 
-            #time.sleep(0.25)
+            #self._vm.idle(0.25)
 
             logger.info("Second set of stops")    
             if not TESTING:        
                 self._send_stop_events_by_int(2, stop_set_soft, NoteAction.PRESS)
                 self._send_stop_events_by_int(4, stop_set_2, NoteAction.PRESS, sleep_first=False)
             else:
-                time.sleep(2)
+                self._vm.idle(2)
 
             self.reset_ranges()
 
@@ -272,7 +277,7 @@ class SongManager:
             self._send_stop_events_by_int(2, stops, NoteAction.PRESS, sleep_first=False)
             last_stops = stops
             vc.cycle_notes(loop_time=0.005, steps=1000)
-            time.sleep(1)
+            self._vm.idle(1)
             self.reset_ranges()
 
         loop_time_fast = 0.0005
@@ -281,56 +286,58 @@ class SongManager:
         vc.cycle_notes(loop_time=loop_time_fast*8, steps=1000)
         self._send_stop_events_by_int(1, last_stops, NoteAction.RELEASE)
         self._send_stop_events_by_int(4, stop_set_3, NoteAction.PRESS, sleep_first=False)
-        #time.sleep(0.2)
+        #self._vm.idle(0.2)
         self.reset_ranges()
         vc.cycle_notes(loop_time=loop_time_fast*4, steps=1000)
         self._send_stop_events_by_int(4, stop_set_2, NoteAction.PRESS, sleep_first=False)
-        #time.sleep(0.2)
+        #self._vm.idle(0.2)
         self.reset_ranges()
         vc.cycle_notes(loop_time=loop_time_fast*2, steps=1000)
         self._send_stop_events_by_int(4, stop_set_soft, NoteAction.PRESS, sleep_first=False)
-        #time.sleep(0.2)
+        #self._vm.idle(0.2)
         self.reset_ranges()
-        vc.cycle_notes(loop_time=loop_time_fast, steps=1000)
-        time.sleep(1)
+        vc.cycle_notes(loop_time=loop_time_fast, steps=1000, easing="s_curve")
+        self._vm.idle(1)
         self.reset_ranges()
         vc.cycle_notes(loop_time=loop_time_fast, steps=1000)
-        time.sleep(0.5)
+        self._vm.idle(0.5)
         self.reset_ranges()
         
+        fast_easings = ("linear", "s_curve", "exponential", "random_walk")
         for k in range(15):
-            vc.cycle_notes(loop_time=loop_time_fast, steps=1000)
+            vc.cycle_notes(loop_time=loop_time_fast, steps=1000, easing=fast_easings[k % len(fast_easings)], seed=k)
             self.reset_ranges()  
-        #time.sleep(2)
+        #self._vm.idle(2)
 
         vc.cycle_notes(loop_time=loop_time_fast*2, steps=1000)
-        #time.sleep(0.5)
+        #self._vm.idle(0.5)
         self.reset_ranges()
         vc.cycle_notes(loop_time=loop_time_fast*4, steps=1000)
         self.reset_ranges()
         vc.cycle_notes(loop_time=loop_time_fast*8, steps=1000)
         self.reset_ranges()
         vc.cycle_notes(loop_time=loop_time_fast*16, steps=1000)
-        time.sleep(1)
+        self._vm.idle(1)
         self.reset_ranges()
 
         logger.info(f"Loading {EXTRA_VOICE_COUNT} more voices")
         #for k in range(EXTRA_VOICE_COUNT):
         #    v = self.add_voice()
         #    logger.info(f"New voice: {v.active_note.pretty} on {v.register.name}")
-        #    time.sleep(1)
+        #    self._vm.idle(1)
 
         queue = vm.queue
         all_notes = {}
         for r in organ:
-            all_notes[r] = get_note_subset(r.note_names, ["C", "E", "G"])
-            for n in r:
-                if n.state.active:
-                    logger.info(f"{n.name.pretty} already playing on {r.name}")
-                    all_notes[r].remove(n.name)
+            all_notes[r] = list(r.note_table.subset(["C", "E", "G"]))
+            for nn in r.sounding_note_names():
+                logger.info(f"{nn.pretty} already playing on {r.name}")
+                all_notes[r].remove(nn)
             #for num, note in enumerate(reversed(all_notes)):
         for k in range(EXTRA_VOICE_COUNT):
-            r = random.choice(list(organ))
+            r = vm.allocator.choose_register()
+            if r is None or not all_notes[r]:
+                r = random.choice([r for r in organ if all_notes[r]])
             note = random.choice(all_notes[r])
             all_notes[r].remove(note)
             v = vm.create_voice(f"{r.name}-middle-{k}", r, RatioVoice) 
@@ -340,12 +347,12 @@ class SongManager:
             #new_voices.append(v)
             v.queue_midi(queue)
             logger.info(f"Creating new voice: {v}")
-            time.sleep(1)
+            self._vm.idle(1)
 
         for v in vm:
             logger.info(f"{v.active_note.pretty} on {v.name}")
 
-        time.sleep(2)
+        self._vm.idle(2)
 
         self.reset_ranges()
         
@@ -354,23 +361,24 @@ class SongManager:
             vc.cycle_notes(loop_time=0.01, steps=1000)
             v = self.add_voice()
             logger.info(f"New voice: {v.active_note.pretty} on {v.register.name}")
-            time.sleep(1)
+            self._vm.idle(1)
             self.reset_ranges()
 
         if LOAD_FINALE_STOPS:
             logger.info("Loading finale stops")
-            self._send_stop_events(0.5, [s for s in list(self._stops.values()) if s not in finale_stops], NoteAction.RELEASE)
-            self._send_stop_events_by_int(2, finale_stops, NoteAction.PRESS, sleep_first=False)
+            releases, presses = self._registration.diff(self._registration["finale"])
+            self._send_stop_events(0.5, releases, NoteAction.RELEASE)
+            self._send_stop_events(2, presses, NoteAction.PRESS, sleep_first=False)
 
         logger.info("Fast Cycles")
         for k in range(2):
             vc.cycle_notes(loop_time=0.001, steps=1000)
             v = self.add_voice()
             logger.info(f"New voice: {v.active_note.pretty} on {v.register.name}")
-            time.sleep(2)
+            self._vm.idle(2)
             self.reset_ranges()
         
-        time.sleep(3)
+        self._vm.idle(3)
         
         logger.info(f"final rise with {len(vm)} voices")
 
@@ -383,11 +391,10 @@ class SongManager:
         queue = vm.queue
         new_voices = []
         for r in organ:
-            all_notes = get_note_subset(r.note_names, ["C", "E", "G"])
-            for n in r:
-                if n.state.active:
-                    logger.info(f"{n.name.pretty} already playing on {r.name}")
-                    all_notes.remove(n.name)
+            all_notes = list(r.note_table.subset(["C", "E", "G"]))
+            for nn in r.sounding_note_names():
+                logger.info(f"{nn.pretty} already playing on {r.name}")
+                all_notes.remove(nn)
             for num, note in enumerate(reversed(all_notes)):
                 v = vm.create_voice(f"{r.name}-finale-{num}", r, RatioVoice) 
                 v.active_note = note
@@ -395,10 +402,15 @@ class SongManager:
                 new_voices.append(v)
                 logger.info(f"Creating new voice: {v}")
 
+        # Stops not pulled once everything already scheduled has been sent,
+        # e.g. the finale load that may still be running.
+        all_stops = self._registration.stops(
+            self._registration.from_stops(list(self._stops.values())) - self._registration.planned()
+        )
+
         if LINEAR_FINALE:
             logger.info("Setting all stops")
             #if not TESTING:
-            all_stops = list(self._stops.values())
             random.shuffle(all_stops)
             logger.info(all_stops)
             self._send_stop_events(10, all_stops, NoteAction.PRESS)
@@ -408,35 +420,42 @@ class SongManager:
                 v.on()
                 v.queue_midi(queue)
                 logger.info(f"Starting new voice: {v}")
-                time.sleep(0.25)
+                self._vm.idle(0.25)
         else:
             logger.info("Doing mixed finale")
-            all_stops = [s for s in list(self._stops.values()) if not s.state.active]
-            #random.shuffle(all_stops)
 
+            # Which voice starts in a voice's slot is decided on the spot,
+            # from the register whose channel is quietest at the time.
+            pending: dict[Register, list[Voice]] = {}
+            for v in new_voices:
+                pending.setdefault(v.register, []).append(v)
+            for voices in pending.values():
+                random.shuffle(voices)
             combined = all_stops + new_voices
             random.shuffle(combined)
             for obj in combined:
                 match obj: 
                     case Stop():
-                        se = obj.get_stop_event(NoteAction.PRESS)
-                        self._queue_event(se)
+                        # Through the engine, so it lands after any pending
+                        # stop changes and the plan stays right.
+                        self._send_stop_events(0, [obj], NoteAction.PRESS, sleep_first=False)
                         logger.info(f"Turning on stop {obj}")
                     case Voice():
-                        obj.on()
-                        obj.queue_midi(queue)
-                        logger.info(f"Starting new voice: {obj}")
+                        v = self._next_quietest_voice(pending)
+                        v.on()
+                        v.queue_midi(queue)
+                        logger.info(f"Starting new voice: {v}")
                     case _:
                         logger.warning(f"Unexpected object in finale: {obj!r}")
-                time.sleep(0.25)
+                self._vm.idle(0.25)
 
         logger.info("FIN.")
-        time.sleep(10)
+        self._vm.idle(10)
 
         vm.all_off()
         vm.queue_all_midi()
 
-        time.sleep(1)
+        self._vm.idle(1)
 
         self._send_stop_events(0, self._stops.values(), NoteAction.RELEASE)
 
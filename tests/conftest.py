@@ -0,0 +1,35 @@
+from pathlib import Path
+
+import pytest
+from loguru import logger
+
+from organ_interface.organ import Organ
+
+CONFIG_PATH: Path = Path(__file__).resolve().parent.parent / "config" / "organ" / "hallgrimskirkja.yml"
+
+
+class CompletingQueue:
+    # Stands in for the MIDI sender: every event is sent as soon as it is put.
+    def __init__(self) -> None:
+        self.events: list = []
+
+    def put(self, event, block: bool=True, timeout: float|None=None) -> None:
+        self.events.append(event)
+        event.midi_complete()
+
+
+@pytest.fixture(autouse=True)
+def quiet_logs():
+    logger.disable("organ_interface")
+    yield
+    logger.enable("organ_interface")
+
+
+@pytest.fixture
+def organ() -> Organ:
+    return Organ.from_file(CONFIG_PATH)
+
+
+@pytest.fixture
+def queue() -> CompletingQueue:
+    return CompletingQueue()
@@ -0,0 +1,77 @@
+from collections import deque
+from concurrent.futures import wait
+from threading import Event, Thread, Timer
+import sys
+
+from organ_interface.commands import CommandQueue
+
+
+def test_submit_without_owner_runs_inline():
+    commands = CommandQueue()
+    assert commands.submit(lambda x: x + 1, 1).result(timeout=0) == 2
+    assert len(commands) == 0
+
+
+def test_submit_races_claim_and_release():
+    # Submitters on several threads while the owner keeps claiming,
+    # draining and releasing: every future has to complete.
+    commands = CommandQueue()
+    done = Event()
+    # Switch threads as often as possible to hit the window.
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    futures = [[] for _ in range(4)]
+
+    def submitter(k: int) -> None:
+        for i in range(5000):
+            futures[k].append(commands.submit(lambda i=i: i))
+
+    def owner() -> None:
+        while not done.is_set():
+            commands.claim()
+            commands.drain()
+            commands.release()
+
+    owner_thread = Thread(target=owner)
+    owner_thread.start()
+    submitters = [Thread(target=submitter, args=(k,)) for k in range(len(futures))]
+    for t in submitters:
+        t.start()
+    try:
+        for t in submitters:
+            t.join()
+    finally:
+        done.set()
+        owner_thread.join()
+        sys.setswitchinterval(interval)
+
+    all_futures = [f for fs in futures for f in fs]
+    _, not_done = wait(all_futures, timeout=5)
+    assert not not_done
+    assert [f.result() for f in futures[0]] == list(range(5000))
+    assert len(commands) == 0
+
+
+def test_release_waits_for_a_submit_in_flight():
+    # A submitter that has seen the owner but not yet appended when the
+    # owner releases: the command must still run.
+    entered = Event()
+    gate = Event()
+
+    class GatedDeque(deque):
+        def append(self, item) -> None:
+            entered.set()
+            gate.wait(1)
+            super().append(item)
+
+    commands = CommandQueue()
+    commands.claim()
+    commands._pending = GatedDeque()
+    futures = []
+    submitter = Thread(target=lambda: futures.append(commands.submit(lambda: "ran")))
+    submitter.start()
+    assert entered.wait(1)
+    Timer(0.1, gate.set).start()
+    commands.release()
+    submitter.join()
+    assert futures[0].result(timeout=1) == "ran"
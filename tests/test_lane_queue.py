@@ -0,0 +1,89 @@
+from queue import Full
+from threading import Thread
+from time import sleep
+
+import pytest
+
+from organ_interface.midi_workers import LaneQueue
+from organ_interface.note_attributes import EventLane, NoteAction
+
+
+def wait_for_waiters(queue: LaneQueue, n: int) -> None:
+    while len(queue._not_full._waiters) < n:
+        sleep(0.001)
+
+
+def test_room_in_one_lane_reaches_its_waiter():
+    queue = LaneQueue({"stop": {"capacity": 1}, "bulk": {"capacity": 1}})
+    queue.put("stop", lane=EventLane.STOP)
+    queue.put("bulk", lane=EventLane.BULK)
+    done: list[EventLane] = []
+
+    def put(lane: EventLane) -> None:
+        queue.put(lane.name, timeout=5.0, lane=lane)
+        done.append(lane)
+
+    # The BULK waiter is first in line, but only the STOP lane frees up.
+    bulk = Thread(target=put, args=(EventLane.BULK,))
+    bulk.start()
+    wait_for_waiters(queue, 1)
+    stop = Thread(target=put, args=(EventLane.STOP,))
+    stop.start()
+    wait_for_waiters(queue, 2)
+    assert queue.get() == "stop"
+    stop.join(timeout=1.0)
+    assert done == [EventLane.STOP]
+    queue.clear()
+    bulk.join()
+
+
+def test_blocking_lane_without_block_rejects():
+    queue = LaneQueue({"stop": {"capacity": 1}})
+    queue.put("stop", lane=EventLane.STOP)
+    with pytest.raises(Full):
+        queue.put("stop", block=False, lane=EventLane.STOP)
+
+
+def test_same_key_events_keep_their_order_across_lanes(organ):
+    queue = LaneQueue()
+    register = organ["Hauptwerk"]
+    a, b = register.notes[0], register.notes[2]
+    for note, action in ((a, NoteAction.PRESS), (a, NoteAction.RELEASE), (b, NoteAction.PRESS)):
+        queue.put(note.get_note_event(action))
+    # A client presses the key the bulk lane is still releasing.
+    event = a.get_note_event(NoteAction.PRESS)
+    event.lane = EventLane.INTERACTIVE
+    queue.put(event)
+    sent = []
+    while not queue.empty():
+        event = queue.get()
+        event.midi_complete()
+        sent.append((event.name, event.action))
+    assert sent == [
+        (a.name, NoteAction.PRESS),
+        (a.name, NoteAction.RELEASE),
+        (b.name, NoteAction.PRESS),
+        (a.name, NoteAction.PRESS),
+    ]
+    assert a.state.active and a.state.count == 1
+
+
+def test_other_keys_still_jump_the_bulk_lane(organ):
+    queue = LaneQueue()
+    a, b = organ["Hauptwerk"].notes[:2]
+    queue.put(a.get_note_event(NoteAction.PRESS))
+    event = b.get_note_event(NoteAction.PRESS)
+    event.lane = EventLane.INTERACTIVE
+    queue.put(event)
+    assert queue.get().name == b.name
+
+
+def test_drop_oldest_evicts_a_key_as_a_whole(organ):
+    queue = LaneQueue({"bulk": {"capacity": 2, "drop_policy": "drop_oldest"}})
+    a, b = organ["Hauptwerk"].notes[:2]
+    queue.put(a.get_note_event(NoteAction.PRESS))
+    queue.put(a.get_note_event(NoteAction.RELEASE))
+    queue.put(b.get_note_event(NoteAction.PRESS))
+    assert [event.name for event in queue.clear()] == [b.name]
+    assert queue.n_dropped[EventLane.BULK] == 2
+    assert a.state.count == 0 and not a.state.active
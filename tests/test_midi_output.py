@@ -0,0 +1,132 @@
+from queue import Full
+from time import monotonic, sleep
+
+import pytest
+
+from organ_interface.midi_workers import MidiOutput, RawStreamPort
+from organ_interface.note_attributes import EventLane, NoteAction
+
+
+def stream_config(**kwargs) -> dict:
+    # raw_stream_device names the port without needing a MIDI interface.
+    return {"queue_size": 16, "min_gap_ns": 0, "raw_stream_device": "/dev/null", **kwargs}
+
+
+def test_shards_on_the_same_port_are_rejected():
+    config = stream_config(shards=[
+        {"name": "manuals", "channels": [1, 2]},
+        {"name": "stops", "channels": [14]},
+    ])
+    with pytest.raises(AssertionError, match="both use port"):
+        MidiOutput(config)
+
+
+def test_shards_on_different_ports():
+    config = stream_config(shards=[
+        {"name": "manuals", "channels": [1, 2]},
+        {"name": "stops", "channels": [14], "raw_stream_device": "/dev/zero"},
+    ])
+    output = MidiOutput(config)
+    assert [s.port_name for s in output.senders] == ["/dev/null", "/dev/zero"]
+
+
+def test_out_of_process_stats_come_from_the_sender_process(organ):
+    output = MidiOutput(stream_config(out_of_process=True))
+    output.start_midi_output_thread()
+    try:
+        note = organ["Hauptwerk"].lowest_note
+        event = note.get_note_event(NoteAction.PRESS)
+        # Queued a second ago: the wait measured over there must include it.
+        event.enqueue_ts = monotonic() - 1.0
+        output.put(event)
+        deadline = monotonic() + 10.0
+        while not note.state.active and monotonic() < deadline:
+            sleep(0.01)
+        stats = output.latency_stats()
+    finally:
+        output.stop_midi_output_thread()
+    assert stats["process"] == "sender"
+    (latency,) = [l for s in stats["senders"].values() for l in s["latency"].values()]
+    assert latency["total"]["n"] == 1
+    assert latency["wait"]["max"] >= 1.0
+
+
+@pytest.mark.parametrize("note_off_as_note_on, off_bytes", [(True, 2), (False, 3)])
+def test_budget_follows_the_stream_port_note_off(note_off_as_note_on, off_bytes):
+    config = stream_config(note_off_as_note_on=note_off_as_note_on, rate_limit={"running_status": True})
+    (sender,) = MidiOutput(config).senders
+    sender.budget.record(bytes((0x90, 60, 100)), monotonic())
+    assert sender.budget.wire_bytes(bytes((0x80, 60, 0))) == off_bytes
+
+
+def test_same_key_events_reach_the_wire_in_order(organ, monkeypatch):
+    wire: list[bytes] = []
+    monkeypatch.setattr(RawStreamPort, "send_raw", lambda port, raw: wire.append(bytes(raw)))
+    output = MidiOutput(stream_config())
+    register = organ["Hauptwerk"]
+    a, b = register.notes[0], register.notes[2]
+    # Queued before the sender starts, so it finds all of them waiting.
+    for note, action in ((a, NoteAction.PRESS), (a, NoteAction.RELEASE), (b, NoteAction.PRESS)):
+        output.put(note.get_note_event(action))
+    event = a.get_note_event(NoteAction.PRESS)
+    event.lane = EventLane.INTERACTIVE
+    output.put(event)
+    output.start_midi_output_thread()
+    deadline = monotonic() + 5.0
+    while not (a.state.active and b.state.active) and monotonic() < deadline:
+        sleep(0.01)
+    output.stop_midi_output_thread()
+    notes = [(raw[0] & 0xF0, raw[1]) for raw in wire if raw[0] & 0xE0 == 0x80 and raw[1] in (a.name.value, b.name.value)]
+    assert notes[:4] == [(0x90, a.name.value), (0x80, a.name.value), (0x90, b.name.value), (0x90, a.name.value)]
+
+
+def test_shards_without_a_matching_interface(monkeypatch):
+    monkeypatch.setattr("organ_interface.midi_workers.get_output_names", lambda: ["Some Other Port"])
+    config = {"queue_size": 16, "min_gap_ns": 0, "midi_interface_names": ["No Such Interface"], "shards": [
+        {"name": "manuals", "channels": [1, 2]},
+        {"name": "stops", "channels": [14]},
+    ]}
+    output = MidiOutput(config)
+    assert [s.port_name for s in output.senders] == [None, None]
+
+
+def test_stopping_silences_once_and_clears_the_state(organ, monkeypatch):
+    wire: list[bytes] = []
+    monkeypatch.setattr(RawStreamPort, "send_raw", lambda port, raw: wire.append(bytes(raw)))
+    output = MidiOutput(stream_config(), organ)
+    note = organ["Hauptwerk"].lowest_note
+    output.start_midi_output_thread()
+    output.put(note.get_note_event(NoteAction.PRESS))
+    deadline = monotonic() + 5.0
+    while not note.state.active and monotonic() < deadline:
+        sleep(0.01)
+    del wire[:]
+    output.stop_midi_output_thread()
+    note_offs = [raw for raw in wire if raw[0] & 0xF0 == 0x80 and raw[1] == note.name.value]
+    assert len(note_offs) == 1
+    assert len(wire) == len(set(wire))
+    assert organ.sounding_keys() == [] and note.state.count == 0
+
+
+def test_panic_clears_the_state(organ, monkeypatch):
+    monkeypatch.setattr(RawStreamPort, "send_raw", lambda port, raw: None)
+    output = MidiOutput(stream_config(), organ)
+    note = organ["Hauptwerk"].lowest_note
+    output.start_midi_output_thread()
+    try:
+        output.put(note.get_note_event(NoteAction.PRESS))
+        deadline = monotonic() + 5.0
+        while not note.state.active and monotonic() < deadline:
+            sleep(0.01)
+        output.panic()
+        assert organ.sounding_keys() == [] and note.state.count == 0
+    finally:
+        output.stop_midi_output_thread()
+
+
+def test_out_of_process_put_before_start_is_refused(organ):
+    output = MidiOutput(stream_config(out_of_process=True))
+    event = organ["Hauptwerk"].lowest_note.get_note_event(NoteAction.PRESS)
+    with pytest.raises(Full):
+        output.put(event, block=False)
+    assert output.latency_stats()["drops"]
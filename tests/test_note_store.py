@@ -0,0 +1,12 @@
+from organ_interface.note_store import NOTES, STOPS, NoteStateStore
+
+
+def test_masks_do_not_share_a_buffer():
+    store = NoteStateStore(2)
+    store.actual[NOTES, 0, 60] = 1
+    store.queued[STOPS, 1, 3] = 1
+    active = store.active_mask(NOTES)
+    queued = store.queued_mask(STOPS)
+    assert active[0, 60] and not active[1, 3]
+    assert queued[1, 3] and not queued[0, 60]
+    assert store.active_counts(NOTES).tolist() == [1, 0]
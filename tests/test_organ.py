@@ -0,0 +1,14 @@
+from organ_interface.note_attributes import NoteAction
+from organ_interface.note_store import NOTES, STOPS
+
+
+def test_transition_leaves_keys_alone_by_default(organ):
+    register = organ["Hauptwerk"]
+    stop, note = register.stops[0], register.notes[0]
+    stop.get_stop_event(NoteAction.PRESS)
+    note.get_note_event(NoteAction.PRESS)
+    target = organ.snapshot()
+    organ.store.reset()
+    assert [step.target for step in organ.transition(target)] == [stop]
+    steps = organ.transition(target, planes=(NOTES, STOPS))
+    assert sorted(step.target.name.value for step in steps) == sorted((stop.name.value, note.name.value))
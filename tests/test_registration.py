@@ -0,0 +1,78 @@
+from threading import get_ident
+from time import monotonic, sleep
+
+from organ_interface.midi_workers import LaneQueue
+from organ_interface.note_attributes import NoteAction
+from organ_interface.registration import RegistrationEngine
+from organ_interface.scheduler import EventScheduler
+from organ_interface.voices import VoiceManager
+
+
+class RecordingEngine(RegistrationEngine):
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.threads: set[int] = set()
+
+    def _queue_stop_event(self, stop, action) -> None:
+        self.threads.add(get_ident())
+        super()._queue_stop_event(stop, action)
+
+
+def test_scheduled_stop_changes_run_on_the_owner(organ, queue):
+    vm = VoiceManager(organ, queue)
+    scheduler = EventScheduler("test-scheduler", dispatch=vm.submit)
+    engine = RecordingEngine(organ, queue, scheduler, sleep=vm.idle)
+    vm.commands.claim()
+    try:
+        engine.schedule(engine.stops(engine["soft"]), NoteAction.PRESS, 0.1)
+        engine.wait()
+        vm.idle(0.05)
+    finally:
+        vm.commands.release()
+        scheduler.stop()
+    assert engine.threads == {get_ident()}
+    assert engine.current() == engine["soft"]
+    assert len(queue.events) == len(engine["soft"])
+
+
+def test_pending_presses_count_as_planned(organ, queue):
+    scheduler = EventScheduler("test-scheduler")
+    engine = RegistrationEngine(organ, queue, scheduler)
+    all_stops = engine.compile([s.name.value for r in organ for s in r.stops])
+    try:
+        releases, presses = engine.diff(engine["finale"])
+        engine.schedule(presses, NoteAction.PRESS, 0.2, sleep_first=False)
+        rest = engine.stops(all_stops - engine.planned())
+        assert not {s.name for s in rest} & {s.name for s in presses}
+        for s in rest:
+            engine.schedule([s], NoteAction.PRESS, 0, sleep_first=False)
+        engine.wait()
+        # Let the scheduler finish the change due at the cursor.
+        sleep(0.05)
+    finally:
+        scheduler.stop()
+    # Every stop pressed exactly once, and the plan matches what was sent.
+    assert len(queue.events) == len(all_stops)
+    assert engine.current() == all_stops == engine.planned()
+
+
+def test_a_full_stop_lane_holds_changes_back_without_blocking(organ):
+    queue = LaneQueue({"stop": {"capacity": 1}})
+    scheduler = EventScheduler("test")
+    engine = RegistrationEngine(organ, queue, scheduler)
+    first, second, third = [s for r in organ for s in r.stops][:3]
+    try:
+        engine._queue_stop_event(first, NoteAction.PRESS)
+        started = monotonic()
+        engine._queue_stop_event(second, NoteAction.PRESS)
+        engine._queue_stop_event(third, NoteAction.PRESS)
+        assert monotonic() - started < 0.05
+        sent = []
+        while len(sent) < 3:
+            event = queue.get(timeout=1.0)
+            event.midi_complete()
+            sent.append(event.name)
+    finally:
+        scheduler.stop()
+    assert sent == [first.name, second.name, third.name]
+    assert all(s.state.active and s.state.count == 1 for s in (first, second, third))
@@ -0,0 +1,63 @@
+from organ_interface.note_store import NOTES
+from organ_interface.voices import RatioVoice, VoiceManager, WebVoice
+
+
+def test_recreating_a_voice_releases_its_note(organ, queue):
+    vm = VoiceManager(organ, queue)
+    register = organ["Hauptwerk"]
+    first = vm.create_voice("x", register, WebVoice)
+    first.on()
+    vm.queue_all_midi()
+    assert organ.store.queued[NOTES].sum() == 1
+
+    second = vm.create_voice("x", register, WebVoice)
+    assert vm["x"] is second
+    assert len(vm) == 1
+    assert organ.store.queued[NOTES].sum() == 0
+    assert organ.store.actual[NOTES].sum() == 0
+
+
+def fill_with_ratio_voices(vm):
+    while vm.allocator.choose_register() is not None:
+        v = vm.create_random_voice(voice_cls=RatioVoice)
+        v.on()
+    vm.queue_all_midi()
+
+
+def test_web_voice_steals_a_song_voice_at_full_occupancy(organ, queue):
+    vm = VoiceManager(organ, queue)
+    fill_with_ratio_voices(vm)
+    n = len(vm)
+    oldest = next(iter(vm))
+
+    web = vm.create_random_voice("client", WebVoice)
+    assert web is not None
+    assert len(vm) == n
+    assert "client" in vm
+    assert oldest.name not in vm
+    assert not oldest.is_on
+
+
+def test_web_voices_are_never_stolen_by_other_clients(organ, queue):
+    vm = VoiceManager(organ, queue)
+    fill_with_ratio_voices(vm)
+    n = len(vm)
+    clients = [vm.create_random_voice(f"client-{k}", WebVoice) for k in range(n)]
+    assert all(c is not None for c in clients)
+    assert vm.count_voices_by_class(RatioVoice) == 0
+
+    # A new client still gets a voice, past the budget.
+    extra = vm.create_random_voice("one-too-many", WebVoice)
+    assert extra is not None and len(vm) == n + 1
+    assert vm.allocator.is_full(extra.register)
+    assert all(c.name in vm and vm[c.name] is c for c in clients)
+    # Song voices cannot take a client's slot, nor go over budget.
+    assert vm.create_random_voice(voice_cls=RatioVoice) is None
+
+
+def test_overflow_can_be_refused(organ, queue):
+    vm = VoiceManager(organ, queue)
+    vm.allocator.overflow = "refuse"
+    while vm.allocator.choose_register() is not None:
+        vm.create_random_voice(voice_cls=WebVoice)
+    assert vm.create_random_voice("one-too-many", WebVoice) is None
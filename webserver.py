@@ -1,3 +1,5 @@
+import asyncio
+
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.staticfiles import StaticFiles
 
@@ -9,6 +11,17 @@ app = FastAPI()
 
 clients: dict[str, dict] = {}
 
+# How long a new client waits for the song thread to make its voice.
+CLIENT_VOICE_TIMEOUT_S: float = 5.0
+
+
+def create_client_voice(vm: VoiceManager, client_id: str) -> WebVoice|None:
+    voice = vm.create_random_voice(voice_id=client_id, voice_cls=WebVoice)
+    if voice is None:
+        return None
+    voice.assign_random_range(["C", "E", "G"], keep_current = False, reset=True)
+    return voice
+
 # ✅ WebSocket FIRST
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
@@ -29,9 +42,20 @@ async def websocket_endpoint(websocket: WebSocket):
             await websocket.close(code=4000)
             return
         
-        if client_id not in clients:
-            client_voice = vm.create_random_voice(voice_id=client_id, voice_cls=WebVoice)
-            client_voice.assign_random_range(["C", "E", "G"], keep_current = False, reset=True)
+        # Also when the client's voice was stolen for someone else.
+        if client_id not in clients or client_id not in vm:
+            # Voices belong to the song thread; it runs this on its next tick.
+            try:
+                client_voice = await asyncio.wait_for(
+                    asyncio.wrap_future(vm.submit(create_client_voice, vm, client_id)),
+                    CLIENT_VOICE_TIMEOUT_S
+                )
+            except asyncio.TimeoutError:
+                logger.error(f"No voice for client {client_id} after {CLIENT_VOICE_TIMEOUT_S} s")
+                client_voice = None
+            if client_voice is None:
+                await websocket.close(code=4001)
+                return
             clients[client_id] = {
                 "voice": client_voice,
                 "slider": 0,
@@ -59,13 +83,9 @@ async def websocket_endpoint(websocket: WebSocket):
 
             if data["type"] == "slider":
                 state["slider"] = data["value"]
-                if hasattr(client_voice, "set_note_num"):
-                    client_voice.set_note_num(data["value"])
-                    if data["touching"]:
-                        client_voice.on()
-                    else:
-                        client_voice.off()
-                    vm.queue_all_midi()
+                if hasattr(client_voice, "set_slider"):
+                    # Flushed by the owner after the command runs.
+                    vm.submit(client_voice.set_slider, data["value"], data["touching"])
 
             # Respond with simple state values only
             await websocket.send_json({"state": {"slider": state["slider"], "visible": state["visible"]}})